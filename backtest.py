@@ -0,0 +1,186 @@
+"""Replay : rejoue des séries de prix enregistrées ou synthétiques à travers les fonctions de trading.
+
+Les portefeuilles vivent dans un MemoryWalletStore (aucune écriture disque) et
+chaque trade passe par execute_buy / execute_sell, le cœur de buy_token /
+sell_token : validations, comptabilité et arrondis sont ceux des trades réels,
+sans verrou, copie de portefeuille ni mise à jour du classement du bot.
+
+    python backtest.py --ticks 5000 --volatility 0.05
+    python backtest.py --contract-address <CA>
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from array import array
+from portfolio import position_pnl, prune_positions, record_deposit
+from storage import MemoryWalletStore
+from trading_bot import execute_buy, execute_sell
+
+
+class PriceSeries:
+    """Série de prix d'un token en colonnes : horodatages, prix et market caps."""
+
+    def __init__(self, contract_address, timestamps, prices, market_caps, sol_price, name=None):
+        self.contract_address = contract_address
+        self.name = name or contract_address
+        self.timestamps = timestamps
+        self.prices = prices
+        self.market_caps = market_caps
+        self.sol_price = sol_price
+
+    def __len__(self):
+        return len(self.prices)
+
+
+def synthetic_series(ticks, start_price=0.001, volatility=0.02, supply=1e9, sol_price=150, seed=None, interval=1):
+    """Génère une marche aléatoire géométrique de ticks prix."""
+    rng = random.Random(seed)
+    started = time.time() - ticks * interval
+    timestamps, prices = array("d"), array("d")
+    price = start_price
+    for index in range(ticks):
+        price *= 1 + rng.gauss(0, volatility)
+        price = max(price, start_price * 1e-6)
+        timestamps.append(started + index * interval)
+        prices.append(price)
+    market_caps = array("d", (price * supply for price in prices))
+    return PriceSeries("SYNTHETIC", timestamps, prices, market_caps, sol_price)
+
+
+def recorded_series(contract_address, sol_price, start=0, end=float("inf")):
+    """Charge les ticks enregistrés par l'historique local des prix."""
+    from price_history import price_history
+
+    ticks = price_history.ticks(contract_address, start, end)
+    return PriceSeries(
+        contract_address,
+        array("d", (tick[0] for tick in ticks)),
+        array("d", (tick[1] for tick in ticks)),
+        array("d", (tick[2] for tick in ticks)),
+        sol_price,
+    )
+
+
+def threshold_strategy(amount_sol=1.0, take_profit=50.0, stop_loss=-30.0):
+    """Achète amount_sol dès qu'aucune position n'est ouverte, revend tout au take profit ou au stop loss (en %)."""
+    def decide(wallet, contract_address, price, market_cap):
+        position = wallet["tokens"].get(contract_address)
+        if position is None:
+            return "buy", amount_sol
+        pnl, _ = position_pnl(position, market_cap)
+        if pnl >= take_profit or pnl <= stop_loss:
+            return "sell", 1.0
+        return None
+    return decide
+
+
+class ReplayEngine:
+    """Rejoue une série de prix pour de nombreux portefeuilles à la fois.
+
+    Les colonnes de la série sont parcourues une seule fois ; à chaque tick,
+    toutes les stratégies sont évaluées et leurs ordres appliqués par
+    execute_buy / execute_sell directement sur les portefeuilles du stockage
+    (lus une fois au début, écrits une fois à la fin). Une stratégie reçoit
+    (portefeuille, adresse, prix, market cap), ne doit pas modifier le
+    portefeuille, et retourne None, ("buy", montant en SOL) ou ("sell",
+    fraction de la position).
+    """
+
+    def __init__(self, store=None, starting_sol=100.0):
+        self.store = store or MemoryWalletStore(keep_history=False)
+        self.starting_sol = starting_sol
+
+    def _fund(self, user_id):
+        wallet = self.store.load(user_id)
+        if not wallet["sol_balance"] and not wallet["tokens"]:
+            record_deposit(wallet, self.starting_sol)
+            wallet["sol_balance"] += self.starting_sol
+        return wallet
+
+    async def run(self, series, strategies):
+        """Rejoue series pour chaque {user_id: stratégie} et retourne le rapport de PnL."""
+        contract_address, name, sol_price = series.contract_address, series.name, series.sol_price
+        accounts = [(user_id, self._fund(user_id), decide, []) for user_id, decide in strategies.items()]
+        started = time.perf_counter()
+        for timestamp, price, market_cap in zip(series.timestamps, series.prices, series.market_caps):
+            for _, wallet, decide, history in accounts:
+                order = decide(wallet, contract_address, price, market_cap)
+                if order is None:
+                    continue
+                side, amount = order
+                if side == "buy":
+                    _, transaction = execute_buy(wallet, contract_address, amount, sol_price, price, market_cap, name, timestamp)
+                else:
+                    _, transaction = execute_sell(wallet, contract_address, f"{amount * 100}%", sol_price, price, name, timestamp)
+                if transaction is not None:
+                    # Comme save_wallet pour les trades du bot
+                    prune_positions(wallet)
+                    history.append(transaction)
+        elapsed = time.perf_counter() - started
+        for user_id, wallet, _, history in accounts:
+            self.store.save(user_id, wallet, history)
+        accounts = [(user_id, wallet) for user_id, wallet, _, _ in accounts]
+        trades = sum(wallet["stats"]["buys"] + wallet["stats"]["sells"] for _, wallet in accounts)
+        last_price = series.prices[-1] if len(series) else 0
+        return self.report(accounts, contract_address, last_price, series.sol_price, trades, len(series), elapsed)
+
+    def report(self, accounts, contract_address, last_price, sol_price, trades, ticks, elapsed):
+        results = []
+        for user_id, wallet in accounts:
+            position = wallet["tokens"].get(contract_address)
+            holdings = position["quantity"] * last_price / sol_price if position else 0
+            stats = wallet["stats"]
+            value = wallet["sol_balance"] + holdings
+            results.append({
+                "user_id": user_id,
+                "value_sol": round(value, 6),
+                "pnl_sol": round(value - stats["deposits"], 6),
+                "realized_pnl_sol": round(stats["realized_pnl"], 6),
+                "trades": stats["buys"] + stats["sells"],
+            })
+        results.sort(key=lambda result: result["pnl_sol"], reverse=True)
+        return {
+            "ticks": ticks,
+            "wallets": len(results),
+            "trades": trades,
+            "seconds": round(elapsed, 3),
+            "trades_per_minute": round(trades / elapsed * 60) if elapsed else 0,
+            "total_pnl_sol": round(sum(result["pnl_sol"] for result in results), 6),
+            "best": results[:5],
+            "worst": results[-5:][::-1],
+        }
+
+
+def strategy_grid(amount_sol, take_profits, stop_losses):
+    """Une stratégie à seuils par combinaison (take profit, stop loss)."""
+    return {
+        f"tp{take_profit:g}_sl{stop_loss:g}": threshold_strategy(amount_sol, take_profit, stop_loss)
+        for take_profit in take_profits
+        for stop_loss in stop_losses
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contract-address", help="rejoue l'historique enregistré de ce token au lieu d'une série synthétique")
+    parser.add_argument("--ticks", type=int, default=10000)
+    parser.add_argument("--volatility", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--sol-price", type=float, default=150.0)
+    parser.add_argument("--amount", type=float, default=1.0, help="SOL engagés par achat")
+    parser.add_argument("--take-profits", type=float, nargs="+", default=[5, 10, 20, 50, 100])
+    parser.add_argument("--stop-losses", type=float, nargs="+", default=[-5, -10, -20, -50])
+    args = parser.parse_args()
+
+    if args.contract_address:
+        series = recorded_series(args.contract_address, args.sol_price)
+    else:
+        series = synthetic_series(args.ticks, volatility=args.volatility, sol_price=args.sol_price, seed=args.seed)
+    strategies = strategy_grid(args.amount, args.take_profits, args.stop_losses)
+    print(json.dumps(asyncio.run(ReplayEngine().run(series, strategies)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
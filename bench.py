@@ -0,0 +1,190 @@
+"""Benchmarks des chemins chauds face à des APIs de marché simulées en local.
+
+Mesure get_token_information, buy_token, sell_token, show_balance et les
+handlers de main.py sous des utilisateurs concurrents, puis compare au
+baseline enregistré (--save-baseline pour le remplacer). Le script sort en
+erreur si une régression est détectée ou si les requêtes concurrentes des
+handlers ne sont pas regroupées.
+
+    python bench.py --users 100 --latency 0.05 --error-rate 0.01
+    python bench.py --burst-period 10 --burst-duration 1 --retry-after 1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from upstream_stubs import start_upstreams, upstream_environ
+
+
+BASELINE_FILE = "bench_baseline.json"
+# Écart toléré avant de signaler une régression (débit en baisse ou p99 en hausse)
+REGRESSION_THRESHOLD = 0.2
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0
+
+
+class Scenario:
+    """Mesure d'un scénario : latences des appels, appels aux APIs et lectures du cache."""
+
+    def __init__(self, name, upstreams, market_cache):
+        self.name = name
+        self.upstreams = upstreams
+        self.market_cache = market_cache
+        self.latencies = []
+
+    def __enter__(self):
+        self._calls = {name: upstream.total_calls for name, upstream in self.upstreams.items()}
+        self._lookups = dict(self.market_cache.lookups)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self._started
+
+    async def timed(self, coroutine):
+        started = time.perf_counter()
+        result = await coroutine
+        self.latencies.append(time.perf_counter() - started)
+        return result
+
+    def result(self):
+        lookups = {kind: count - self._lookups[kind] for kind, count in self.market_cache.lookups.items()}
+        total_lookups = sum(lookups.values())
+        return {
+            "calls": len(self.latencies),
+            "seconds": round(self.seconds, 3),
+            "ops_per_second": round(len(self.latencies) / self.seconds, 1) if self.seconds else 0,
+            "p50_ms": round(statistics.median(self.latencies) * 1000, 2) if self.latencies else 0,
+            "p99_ms": round(percentile(self.latencies, 0.99) * 1000, 2),
+            "upstream_calls": {name: upstream.total_calls - self._calls[name] for name, upstream in self.upstreams.items()},
+            "cache_hit_rate": round((lookups["hit"] + lookups["stale"]) / total_lookups, 3) if total_lookups else None,
+        }
+
+
+async def run_benchmarks(upstreams, users, rounds, tokens, concurrency, updates):
+    # Importés ici : constants lit les URLs surchargées au moment de l'import
+    import loadtest
+    from market_cache import market_cache
+    from trading_bot import add_sol, buy_token, get_token_information, load_wallet, sell_token, show_balance
+
+    rng = random.Random(0)
+    addresses = [f"Bench{i:039d}" for i in range(tokens)]
+    user_ids = list(range(20_000, 20_000 + users))
+    results = {}
+
+    async def measure(name, make_call):
+        with Scenario(name, upstreams, market_cache) as scenario:
+            for _ in range(rounds):
+                await asyncio.gather(*(scenario.timed(make_call(user_id)) for user_id in user_ids))
+        results[name] = scenario.result()
+
+    # Cache vide : métadonnées et prix récupérés auprès des APIs
+    await measure("get_token_information_cold", lambda user_id: get_token_information(rng.choice(addresses)))
+    await measure("get_token_information_warm", lambda user_id: get_token_information(rng.choice(addresses)))
+
+    for user_id in user_ids:
+        await add_sol(user_id, "1000")
+    await measure("buy_token", lambda user_id: buy_token(user_id, rng.choice(addresses), "0.1"))
+    await measure("show_balance", show_balance)
+    # Vente d'un token effectivement détenu (sinon on mesure le retour anticipé « token non détenu »)
+    held = {user_id: list((await load_wallet(user_id))["tokens"]) for user_id in user_ids}
+    await measure("sell_token", lambda user_id: sell_token(user_id, rng.choice(held[user_id]), "50%"))
+
+    # Handlers Telegram complets (API Telegram simulée par loadtest)
+    with Scenario("handlers", upstreams, market_cache) as scenario:
+        handlers = await loadtest.run(users, updates, 0, concurrency, min(tokens, 5), seed_market=False)
+    results["handlers"] = {
+        **scenario.result(),
+        "calls": handlers["updates"],
+        "ops_per_second": handlers["updates_per_second"],
+        "p50_ms": handlers["p50_ms"],
+        "p99_ms": handlers["p99_ms"],
+    }
+    return results
+
+
+def coalescing_failures(results, users):
+    """Vérifie, sans baseline, que les requêtes concurrentes des handlers sont regroupées.
+
+    Tous les utilisateurs du scénario handlers consultent les mêmes tokens :
+    une API appelée une fois par utilisateur (ou presque) signale des
+    récupérations en double.
+    """
+    failures = []
+    for upstream, calls in results.get("handlers", {}).get("upstream_calls", {}).items():
+        if users > 2 and calls >= users / 2:
+            failures.append(f"handlers: {calls} {upstream} calls for {users} users viewing the same tokens (requests not coalesced)")
+    return failures
+
+
+def compare(results, baseline):
+    """Retourne les régressions par rapport au baseline (débit, p99 ou appels aux APIs au-delà du seuil)."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for upstream, calls in result.get("upstream_calls", {}).items():
+            before = previous.get("upstream_calls", {}).get(upstream, 0)
+            if calls > before * (1 + REGRESSION_THRESHOLD) and calls > before + 1:
+                regressions.append(f"{name}: {calls} {upstream} calls (baseline {before})")
+        if previous["ops_per_second"] and result["ops_per_second"] < previous["ops_per_second"] * (1 - REGRESSION_THRESHOLD):
+            regressions.append(f"{name}: {result['ops_per_second']} ops/s (baseline {previous['ops_per_second']})")
+        if previous["p99_ms"] and result["p99_ms"] > previous["p99_ms"] * (1 + REGRESSION_THRESHOLD):
+            regressions.append(f"{name}: p99 {result['p99_ms']} ms (baseline {previous['p99_ms']})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5, help="appels par utilisateur et par scénario")
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--updates", type=int, default=5, help="mises à jour Telegram par utilisateur")
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.02, help="latence des APIs simulées (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-period", type=float, default=0, help="période des rafales de 429 (s)")
+    parser.add_argument("--burst-duration", type=float, default=0, help="durée de chaque rafale de 429 (s)")
+    parser.add_argument("--retry-after", type=int, default=None)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    upstreams = start_upstreams(
+        latency=args.latency, error_rate=args.error_rate, burst_period=args.burst_period,
+        burst_duration=args.burst_duration, retry_after=args.retry_after, seed=0,
+    )
+    os.environ.update(upstream_environ(upstreams))
+    try:
+        results = asyncio.run(run_benchmarks(upstreams, args.users, args.rounds, args.tokens, args.concurrency, args.updates))
+    finally:
+        for upstream in upstreams.values():
+            upstream.stop()
+    print(json.dumps(results, indent=2))
+
+    failures = coalescing_failures(results, args.users)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file))
+        print("\n".join(["Regressions against baseline:", *regressions]) if regressions else "No regression against baseline.")
+        failures += regressions
+    if failures:
+        print("\n".join(["Benchmark failed:", *failures]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
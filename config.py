@@ -0,0 +1,175 @@
+import functools
+import os
+from dataclasses import dataclass, field, replace
+from dotenv import dotenv_values
+
+STORAGE_BACKENDS = ("json", "sqlite", "memory")
+CACHE_BACKENDS = ("local", "sqlite", "redis")
+
+
+@dataclass(frozen=True)
+class Config:
+    """Paramètres lus dans l'environnement (et le fichier .env), typés et vérifiés en une fois.
+
+    Les secrets sont exclus de repr() : un Config peut être journalisé tel quel.
+    errors et warnings listent les problèmes détectés au chargement ; main()
+    refuse de démarrer tant que errors n'est pas vide.
+    """
+
+    telegram_bot_token: str = field(default=None, repr=False)
+    birdeye_api_key: str = field(default=None, repr=False)
+    webhook_secret: str = field(default=None, repr=False)
+    railway: bool = False
+    storage_backend: str = "json"
+    cache_backend: str = "local"
+    binance_api_url: str = "https://api.binance.com/api/v3/ticker/price?symbol=SOLUSDT"
+    dex_api_url: str = "https://api.dexscreener.com/tokens/v1/solana/"
+    birdeye_api_url: str = "https://public-api.birdeye.so/defi/price?address="
+    birdeye_multi_price_url: str = "https://public-api.birdeye.so/defi/multi_price?list_address="
+    rpc_url: str = "https://api.mainnet-beta.solana.com"
+    binance_rps: float = 10
+    birdeye_rps: float = 5
+    rpc_rps: float = 8
+    dex_rps: float = 4
+    concurrent_updates: int = 64
+    blocking_pool_size: int = 8
+    webhook_url: str = None
+    webhook_listen: str = "0.0.0.0"
+    webhook_port: int = 8443
+    webhook_path: str = "telegram"
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9464
+    admin_ids: frozenset = frozenset()
+    workers: int = 0
+    shard_index: int = -1
+    shared_cache_db: str = None
+    redis_url: str = "redis://localhost:6379/0"
+    errors: tuple = ()
+    warnings: tuple = ()
+
+    def summary(self):
+        """Résumé d'une ligne pour le journal de démarrage, sans aucun secret."""
+        mode = f"webhook on {self.webhook_listen}:{self.webhook_port}" if self.webhook_url else "polling"
+        metrics = f"{self.metrics_host}:{self.metrics_port}" if self.metrics_port else "off"
+        return (
+            f"storage={self.storage_backend} cache={self.cache_backend} workers={self.workers} "
+            f"mode={mode} metrics={metrics} birdeye_key={'set' if self.birdeye_api_key else 'missing'}"
+        )
+
+    def check(self):
+        """Lève SystemExit avec la liste complète des erreurs de configuration, s'il y en a."""
+        if self.errors:
+            raise SystemExit("Invalid configuration:\n" + "\n".join(f"  - {error}" for error in self.errors))
+
+
+def _read(environ, name, default, cast, errors):
+    """Lit et convertit une variable ; en cas d'échec, note l'erreur et garde la valeur par défaut.
+
+    Les modules peuvent ainsi être importés même avec une configuration
+    invalide : c'est Config.check(), au démarrage, qui refuse de lancer le bot.
+    """
+    raw = environ.get(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        return cast(raw)
+    except ValueError as e:
+        errors.append(f"{name}={raw!r}: {e}")
+        return default
+
+
+def _choice(choices):
+    def parse(raw):
+        if raw not in choices:
+            raise ValueError(f"expected one of {', '.join(choices)}")
+        return raw
+    return parse
+
+
+def _parse_ids(raw):
+    try:
+        return frozenset(int(user_id) for user_id in raw.split(",") if user_id.strip())
+    except ValueError:
+        raise ValueError("expected a comma-separated list of user ids") from None
+
+
+def load_config(environ=None):
+    """Construit le Config depuis l'environnement (os.environ complété par .env par défaut).
+
+    Le fichier .env est seulement lu : os.environ n'est pas modifié, et une
+    variable déjà définie dans l'environnement l'emporte sur le fichier.
+    """
+    if environ is None:
+        environ = {**dotenv_values(), **os.environ}
+    errors = []
+    warnings = []
+    defaults = Config()
+
+    def read(name, default, cast=str):
+        return _read(environ, name, default, cast, errors)
+
+    config = Config(
+        telegram_bot_token=read("TELEGRAM_BOT_TOKEN", None),
+        birdeye_api_key=read("BIRDEYE_API_KEY", None),
+        webhook_secret=read("WEBHOOK_SECRET", None),
+        railway=bool(environ.get("RAILWAY_ENVIRONMENT")),
+        storage_backend=read("STORAGE_BACKEND", defaults.storage_backend, _choice(STORAGE_BACKENDS)),
+        cache_backend=read("CACHE_BACKEND", defaults.cache_backend, _choice(CACHE_BACKENDS)),
+        binance_api_url=read("BINANCE_API_URL", defaults.binance_api_url),
+        dex_api_url=read("DEX_API_URL", defaults.dex_api_url),
+        birdeye_api_url=read("BIRDEYE_API_URL", defaults.birdeye_api_url),
+        birdeye_multi_price_url=read("BIRDEYE_MULTI_PRICE_URL", defaults.birdeye_multi_price_url),
+        rpc_url=read("RPC_URL", defaults.rpc_url),
+        binance_rps=read("BINANCE_RPS", defaults.binance_rps, float),
+        birdeye_rps=read("BIRDEYE_RPS", defaults.birdeye_rps, float),
+        rpc_rps=read("RPC_RPS", defaults.rpc_rps, float),
+        dex_rps=read("DEX_RPS", defaults.dex_rps, float),
+        concurrent_updates=read("CONCURRENT_UPDATES", defaults.concurrent_updates, int),
+        blocking_pool_size=read("BLOCKING_POOL_SIZE", defaults.blocking_pool_size, int),
+        webhook_url=read("WEBHOOK_URL", None),
+        webhook_listen=read("WEBHOOK_LISTEN", defaults.webhook_listen),
+        # PORT est imposé par les hébergeurs (Railway, Heroku…)
+        webhook_port=read("PORT", read("WEBHOOK_PORT", defaults.webhook_port, int), int),
+        webhook_path=read("WEBHOOK_PATH", defaults.webhook_path),
+        metrics_host=read("METRICS_HOST", defaults.metrics_host),
+        metrics_port=read("METRICS_PORT", defaults.metrics_port, int),
+        admin_ids=read("ADMIN_IDS", defaults.admin_ids, _parse_ids),
+        workers=read("WORKERS", defaults.workers, int),
+        shard_index=read("SHARD_INDEX", defaults.shard_index, int),
+        shared_cache_db=read("SHARED_CACHE_DB", None),
+        redis_url=read("REDIS_URL", defaults.redis_url),
+    )
+
+    if not config.telegram_bot_token:
+        errors.append("TELEGRAM_BOT_TOKEN is not set")
+    elif ":" not in config.telegram_bot_token:
+        errors.append("TELEGRAM_BOT_TOKEN does not look like a bot token (expected '<id>:<secret>')")
+    for name in ("binance_rps", "birdeye_rps", "rpc_rps", "dex_rps"):
+        if getattr(config, name) <= 0:
+            errors.append(f"{name.upper()} must be greater than zero")
+    if config.concurrent_updates < 1:
+        errors.append("CONCURRENT_UPDATES must be at least 1")
+    if config.blocking_pool_size < 1:
+        errors.append("BLOCKING_POOL_SIZE must be at least 1")
+    if config.workers < 0:
+        errors.append("WORKERS must be zero or positive")
+    for name in ("webhook_port", "metrics_port"):
+        if not 0 <= getattr(config, name) <= 65535:
+            errors.append(f"{name.upper()} must be between 0 and 65535")
+    if config.webhook_url and not config.webhook_url.startswith("https://"):
+        errors.append("WEBHOOK_URL must be an https:// URL (Telegram refuses plain http)")
+
+    if not config.birdeye_api_key:
+        warnings.append("BIRDEYE_API_KEY is not set: Birdeye price lookups will be rejected")
+    if config.workers > 1 and config.cache_backend == "local":
+        warnings.append("WORKERS > 1 with CACHE_BACKEND=local: each worker keeps its own market cache")
+    if config.webhook_url and not config.webhook_secret:
+        warnings.append("WEBHOOK_SECRET is not set: webhook requests are not authenticated")
+
+    return replace(config, errors=tuple(errors), warnings=tuple(warnings))
+
+
+@functools.lru_cache(maxsize=None)
+def get_config():
+    """Retourne le Config du processus, construit (et .env lu) au premier appel seulement."""
+    return load_config()
@@ -1,50 +1,133 @@
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-print(f"Telegram Bot Token loaded: {TELEGRAM_BOT_TOKEN}")
+from config import get_config
 
+# Valeurs lues dans l'environnement : voir config.py (typage et validation).
+# Elles ne sont calculées qu'au premier accès (voir __getattr__ en fin de
+# module) : importer constants ne lit ni le fichier .env ni os.environ, et une
+# valeur affectée avant ce premier accès (bancs d'essai) est gardée telle quelle.
+# Les modules les lisent sous la forme constants.NOM au moment de s'en servir,
+# jamais par « from constants import NOM » à l'import.
+_FROM_CONFIG = {}  # nom -> fonction(config) retournant la valeur
+_FROM_CONFIG["TELEGRAM_BOT_TOKEN"] = lambda c: c.telegram_bot_token
 
 WALLET_FILE = "wallet.json"
-WALLETS_DIR = "/data/wallets"
-# URLs des API
-BINANCE_API_URL = "https://api.binance.com/api/v3/ticker/price?symbol=SOLUSDT"
-DEX_API_URL = "https://api.dexscreener.com/tokens/v1/solana/"
-BIRDEYE_API_URL = "https://public-api.birdeye.so/defi/price?address="
-RPC_URL = "https://api.mainnet-beta.solana.com"  # URL du RPC public
+# Utiliser /tmp pour le cloud gratuit (Railway), /data pour persistance si payant
+_FROM_CONFIG["WALLETS_DIR"] = lambda c: "/tmp/wallets" if c.railway else "C:\\Users\\zacha\\Desktop\\VScode\\DemoBot\\cuddly-train\\wallets"
+_FROM_CONFIG["LIMIT_ORDERS_DIR"] = lambda c: "/tmp/limit_orders" if c.railway else "C:\\Users\\zacha\\Desktop\\VScode\\DemoBot\\cuddly-train\\limit_orders"
+_FROM_CONFIG["HISTORY_DIR"] = lambda c: "/tmp/history" if c.railway else "C:\\Users\\zacha\\Desktop\\VScode\\DemoBot\\cuddly-train\\history"
+_FROM_CONFIG["WALLETS_DB"] = lambda c: "/tmp/wallets.db" if c.railway else "C:\\Users\\zacha\\Desktop\\VScode\\DemoBot\\cuddly-train\\wallets.db"
+# Stockage des portefeuilles : "json" (un fichier par utilisateur), "sqlite" ou "memory"
+_FROM_CONFIG["STORAGE_BACKEND"] = lambda c: c.storage_backend
+HISTORY_PAGE_SIZE = 10  # transactions par page de l'historique
+WALLET_CACHE_SIZE = 5000  # portefeuilles gardés en mémoire
+WALLET_FLUSH_INTERVAL = 2  # secondes maximum avant écriture d'un portefeuille modifié
+LIMIT_ORDER_CHECK_INTERVAL = 5  # secondes entre deux vérifications des ordres limites
+_FROM_CONFIG["TOKEN_METADATA_FILE"] = lambda c: "/tmp/token_metadata.json" if c.railway else "C:\\Users\\zacha\\Desktop\\VScode\\DemoBot\\cuddly-train\\token_metadata.json"
+# URLs des API (surchargeables pour pointer vers des APIs simulées)
+_FROM_CONFIG["BINANCE_API_URL"] = lambda c: c.binance_api_url
+_FROM_CONFIG["DEX_API_URL"] = lambda c: c.dex_api_url
+_FROM_CONFIG["BIRDEYE_API_URL"] = lambda c: c.birdeye_api_url
+_FROM_CONFIG["BIRDEYE_MULTI_PRICE_URL"] = lambda c: c.birdeye_multi_price_url
+_FROM_CONFIG["RPC_URL"] = lambda c: c.rpc_url  # URL du RPC public
 
-BIRDEYE_API_KEY = os.getenv("BIRDEYE_API_KEY")
+_FROM_CONFIG["BIRDEYE_API_KEY"] = lambda c: c.birdeye_api_key
+
+# Taille maximale des requêtes groupées
+BIRDEYE_BATCH_SIZE = 100
+RPC_BATCH_SIZE = 100
+DEX_BATCH_SIZE = 30
 
 # Cache
 CACHE_TTL = 10  # 3 minutes
-CACHE_MAXSIZE = 128
+CACHE_MAXSIZE = 1024
+# TTL (en secondes) par type de donnée du cache de marché
+CACHE_TTLS = {
+    "default": CACHE_TTL,
+    "sol_price": 15,
+    "price": CACHE_TTL,
+}
+CACHE_STALE_TTL = 60  # durée pendant laquelle une valeur expirée reste servie
+TOKEN_METADATA_TTL = 24 * 3600  # nom / supply / décimales changent rarement
+TOKEN_METADATA_MISSING_TTL = 120  # secondes avant de redemander un token sans nom ni supply
+TOKEN_METADATA_FLUSH_INTERVAL = 30  # secondes entre deux écritures des métadonnées modifiées
 
-# Répertoire telegram_token
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-import os
-from dotenv import load_dotenv
+# Client HTTP
+HTTP_TIMEOUT = 10  # secondes par requête
+HTTP_MAX_CONNECTIONS = 20
+HTTP_MAX_KEEPALIVE = 10
+HTTP_MAX_RETRIES = 3
+MAX_CONCURRENT_LOOKUPS = 10  # requêtes groupées envoyées en parallèle
+HTTP_RETRY_BASE_DELAY = 1  # secondes, doublé à chaque tentative (avec jitter)
 
-load_dotenv()
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-print(f"Telegram Bot Token loaded: {TELEGRAM_BOT_TOKEN}")
+# Budgets par API : (requêtes par seconde, rafale maximale)
+_FROM_CONFIG["RATE_LIMITS"] = lambda c: {
+    "binance": (c.binance_rps, 10),
+    "birdeye": (c.birdeye_rps, 5),  # à adapter au plan Birdeye
+    "rpc": (c.rpc_rps, 10),  # RPC public : 100 requêtes / 10 s
+    "dexscreener": (c.dex_rps, 5),  # 300 requêtes / minute
+}
 
+# Rafraîchissement des prix en arrière-plan
+PRICE_REFRESH_TICK = 1  # secondes entre deux passages du planificateur
+PRICE_REFRESH_MIN_INTERVAL = 3  # tokens volatils ou très consultés
+PRICE_REFRESH_MAX_INTERVAL = 60  # tokens inactifs
+PRICE_REFRESH_VIEW_TTL = 600  # un token consulté reste suivi 10 minutes
+HELD_TOKENS_REFRESH_INTERVAL = 60  # secondes entre deux relectures des tokens détenus
 
-WALLET_FILE = "wallet.json"
-# Utiliser /tmp pour le cloud gratuit (Railway), /data pour persistance si payant
-WALLETS_DIR = "/tmp/wallets" if os.getenv("RAILWAY_ENVIRONMENT") else "C:\\Users\\zacha\\Desktop\\VScode\\DemoBot\\cuddly-train\\wallets"
-LIMIT_ORDERS_DIR = "/tmp/limit_orders" if os.getenv("RAILWAY_ENVIRONMENT") else "C:\\Users\\zacha\\Desktop\\VScode\\DemoBot\\cuddly-train\\limit_orders"
-# URLs des API
-BINANCE_API_URL = "https://api.binance.com/api/v3/ticker/price?symbol=SOLUSDT"
-DEX_API_URL = "https://api.dexscreener.com/tokens/v1/solana/"
-BIRDEYE_API_URL = "https://public-api.birdeye.so/defi/price?address="
-RPC_URL = "https://api.mainnet-beta.solana.com"  # URL du RPC public
+# Solde en direct
+LIVE_BALANCE_INTERVAL = 5  # secondes entre deux éditions (limite Telegram par chat)
+LIVE_BALANCE_DURATION = 300  # le mode direct s'arrête après 5 minutes
+REFRESH_COOLDOWN = 10  # secondes minimum entre deux invalidations via le bouton Refresh
 
-BIRDEYE_API_KEY = os.getenv("BIRDEYE_API_KEY")
+# Service des mises à jour Telegram
+_FROM_CONFIG["CONCURRENT_UPDATES"] = lambda c: c.concurrent_updates  # mises à jour traitées en parallèle
+_FROM_CONFIG["BLOCKING_POOL_SIZE"] = lambda c: c.blocking_pool_size  # threads pour les opérations bloquantes
+DRAIN_TIMEOUT = 30  # secondes accordées aux mises à jour en cours à l'arrêt
+# Mode webhook : activé si WEBHOOK_URL est défini, sinon polling
+_FROM_CONFIG["WEBHOOK_URL"] = lambda c: c.webhook_url
+_FROM_CONFIG["WEBHOOK_LISTEN"] = lambda c: c.webhook_listen
+_FROM_CONFIG["WEBHOOK_PORT"] = lambda c: c.webhook_port
+_FROM_CONFIG["WEBHOOK_PATH"] = lambda c: c.webhook_path
+_FROM_CONFIG["WEBHOOK_SECRET"] = lambda c: c.webhook_secret
+
+# Classement
+LEADERBOARD_SIZE = 10
+LEADERBOARD_MTM_INTERVAL = 30  # secondes entre deux revalorisations du PNL latent
+LEADERBOARD_REBUILD_INTERVAL = 120  # multi-processus : relecture des portefeuilles des autres workers
+
+# Historique local des prix
+_FROM_CONFIG["PRICE_HISTORY_DIR"] = lambda c: "/tmp/price_history" if c.railway else "C:\\Users\\zacha\\Desktop\\VScode\\DemoBot\\cuddly-train\\price_history"
+PRICE_HISTORY_FLUSH_INTERVAL = 10  # secondes entre deux écritures des ticks en attente
+
+# Métriques : endpoint Prometheus local (port 0 pour le désactiver) et commande /perf
+_FROM_CONFIG["METRICS_HOST"] = lambda c: c.metrics_host
+# Un endpoint de métriques par worker : port de base + 1 + SHARD_INDEX
+_FROM_CONFIG["METRICS_PORT"] = lambda c: c.metrics_port + 1 + c.shard_index if c.shard_index >= 0 and c.metrics_port else c.metrics_port
+_FROM_CONFIG["ADMIN_IDS"] = lambda c: c.admin_ids
+
+# Déploiement multi-processus : un routeur répartit les mises à jour entre WORKERS processus
+# selon un hachage de l'user_id ; le cache de marché est partagé via CACHE_BACKEND
+_FROM_CONFIG["WORKERS"] = lambda c: c.workers  # 0 : un seul processus
+_FROM_CONFIG["SHARD_INDEX"] = lambda c: c.shard_index  # défini par le routeur pour chaque worker
+_FROM_CONFIG["CACHE_BACKEND"] = lambda c: c.cache_backend  # "local", "sqlite" ou "redis"
+_FROM_CONFIG["SHARED_CACHE_DB"] = lambda c: c.shared_cache_db or ("/tmp/market_cache.db" if c.railway else "C:\\Users\\zacha\\Desktop\\VScode\\DemoBot\\cuddly-train\\market_cache.db")
+_FROM_CONFIG["REDIS_URL"] = lambda c: c.redis_url
+
+# Rendu des messages
+TELEGRAM_MESSAGE_LIMIT = 4096  # longueur maximale d'un message Telegram (unités UTF-16)
+RENDER_CACHE_SIZE = 4096  # blocs de token gardés en cache
+
+# Instantané du cache de marché : rechargé au démarrage (valeurs servies comme périmées)
+_FROM_CONFIG["MARKET_SNAPSHOT_FILE"] = lambda c: "/tmp/market_snapshot.jsonl" if c.railway else "C:\\Users\\zacha\\Desktop\\VScode\\DemoBot\\cuddly-train\\market_snapshot.jsonl"
+MARKET_SNAPSHOT_INTERVAL = 60  # secondes entre deux écritures de l'instantané
+MARKET_SNAPSHOT_MAX_AGE = 900  # au-delà, une valeur de l'instantané n'est pas rechargée
+WARM_UP_BATCH_SIZE = BIRDEYE_BATCH_SIZE  # tokens détenus rafraîchis par requête groupée au démarrage
 
-# Cache
-CACHE_TTL = 10  # 3 minutes
-CACHE_MAXSIZE = 128
 
-# Répertoire telegram_token
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+def __getattr__(name):
+    """Calcule au premier accès une valeur issue de la configuration et la garde dans le module."""
+    try:
+        resolve = _FROM_CONFIG[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = globals()[name] = resolve(get_config())
+    return value
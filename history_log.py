@@ -0,0 +1,84 @@
+import json
+import os
+import struct
+import constants
+
+
+# Chaque entrée de l'index est l'offset (uint64) d'une ligne du fichier JSON Lines
+OFFSET = struct.Struct("<Q")
+
+
+class HistoryLog:
+    """Historique des transactions en ajout seul, un fichier JSON Lines par utilisateur.
+
+    Un petit index binaire d'offsets permet de lire une page sans parcourir
+    le reste du fichier.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or constants.HISTORY_DIR
+
+    def _paths(self, user_id):
+        base = os.path.join(self.directory, f"history_{user_id}")
+        return f"{base}.jsonl", f"{base}.idx"
+
+    def append(self, user_id, entries):
+        """Ajoute des transactions à la fin de l'historique sans réécrire les anciennes."""
+        if not entries:
+            return
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        log_path, index_path = self._paths(user_id)
+        self._ensure_index(user_id)
+        offsets = []
+        with open(log_path, "ab") as log:
+            for entry in entries:
+                offsets.append(log.tell())
+                log.write(json.dumps(entry).encode() + b"\n")
+        with open(index_path, "ab") as index:
+            index.write(b"".join(OFFSET.pack(offset) for offset in offsets))
+
+    def count(self, user_id):
+        """Retourne le nombre de transactions enregistrées."""
+        self._ensure_index(user_id)
+        _, index_path = self._paths(user_id)
+        if not os.path.exists(index_path):
+            return 0
+        return os.path.getsize(index_path) // OFFSET.size
+
+    def read_range(self, user_id, start, end):
+        """Retourne les transactions d'indices [start, end), dans l'ordre chronologique."""
+        total = self.count(user_id)
+        start, end = max(start, 0), min(end, total)
+        if start >= end:
+            return []
+        log_path, index_path = self._paths(user_id)
+        with open(index_path, "rb") as index:
+            index.seek(start * OFFSET.size)
+            first = OFFSET.unpack(index.read(OFFSET.size))[0]
+            index.seek(end * OFFSET.size)
+            following = index.read(OFFSET.size)
+        with open(log_path, "rb") as log:
+            log.seek(first)
+            chunk = log.read(OFFSET.unpack(following)[0] - first) if following else log.read()
+        return [json.loads(line) for line in chunk.splitlines() if line]
+
+    def read_page(self, user_id, page, page_size):
+        """Retourne la page demandée (0 = la plus récente), dans l'ordre chronologique."""
+        end = self.count(user_id) - page * page_size
+        return self.read_range(user_id, end - page_size, end)
+
+    def _ensure_index(self, user_id):
+        # Reconstruit l'index s'il manque (ex. fichier JSON Lines copié à la main)
+        log_path, index_path = self._paths(user_id)
+        if os.path.exists(index_path) or not os.path.exists(log_path):
+            return
+        offsets = []
+        with open(log_path, "rb") as log:
+            offset = 0
+            for line in log:
+                if line.strip():
+                    offsets.append(offset)
+                offset += len(line)
+        with open(index_path, "wb") as index:
+            index.write(b"".join(OFFSET.pack(offset) for offset in offsets))
@@ -0,0 +1,124 @@
+import asyncio
+import bisect
+import logging
+from market_cache import market_cache
+from portfolio import position_pnl
+from price_feed import price_feed
+from token_metadata import token_metadata
+
+
+class Leaderboard:
+    """Classement des traders par PNL réalisé + PNL latent.
+
+    Le classement est une liste triée de (-score, user_id) : le top N et le
+    rang d'un utilisateur se lisent par bisection, sans ouvrir aucun
+    portefeuille. Le PNL réalisé est mis à jour à chaque trade, le PNL
+    latent est revalorisé périodiquement pour les tokens dont le prix a
+    bougé.
+    """
+
+    def __init__(self):
+        self._ranking = []  # (-score, user_id), trié
+        self._scores = {}  # user_id -> score
+        self._realized = {}  # user_id -> PNL réalisé
+        self._unrealized = {}  # user_id -> PNL latent
+        self._positions = {}  # user_id -> {adresse: position}
+        self._holders = {}  # adresse -> ensemble des user_id qui la détiennent
+        self._moved = set()  # tokens dont le prix a changé depuis la dernière revalorisation
+
+    def __len__(self):
+        return len(self._ranking)
+
+    def _set_score(self, user_id, score):
+        old = self._scores.get(user_id)
+        if old is not None:
+            index = bisect.bisect_left(self._ranking, (-old, user_id))
+            if index < len(self._ranking) and self._ranking[index] == (-old, user_id):
+                del self._ranking[index]
+        self._scores[user_id] = score
+        bisect.insort(self._ranking, (-score, user_id))
+
+    def _unrealized_pnl(self, user_id):
+        total = 0
+        for ca, data in self._positions.get(user_id, {}).items():
+            price = market_cache.get(("price", ca), allow_stale=True)
+            metadata = token_metadata.get(ca, record=False)
+            if price is None or metadata is None or not data.get("purchase_market_cap"):
+                continue
+            total += position_pnl(data, float(price) * metadata["supply"])[1]
+        return total
+
+    def record_wallet(self, user_id, wallet):
+        """Met à jour le classement d'un utilisateur après un trade."""
+        user_id = str(user_id)
+        for ca in self._positions.get(user_id, {}):
+            self._holders.get(ca, set()).discard(user_id)
+        positions = {ca: dict(data) for ca, data in wallet.get("tokens", {}).items()}
+        self._positions[user_id] = positions
+        for ca in positions:
+            self._holders.setdefault(ca, set()).add(user_id)
+        self._realized[user_id] = wallet.get("general_pnl", 0)
+        self._unrealized[user_id] = self._unrealized_pnl(user_id)
+        self._set_score(user_id, self._realized[user_id] + self._unrealized[user_id])
+
+    def on_price(self, contract_address, price):
+        """Abonné du flux de prix : note les tokens à revaloriser."""
+        if contract_address in self._holders:
+            self._moved.add(contract_address)
+
+    def mark_to_market(self):
+        """Revalorise le PNL latent des détenteurs des tokens dont le prix a bougé."""
+        moved, self._moved = self._moved, set()
+        users = set()
+        for ca in moved:
+            users.update(self._holders.get(ca, ()))
+        for user_id in users:
+            self._unrealized[user_id] = self._unrealized_pnl(user_id)
+            self._set_score(user_id, self._realized[user_id] + self._unrealized[user_id])
+        return len(users)
+
+    async def rebuild(self, wallets, keep=None):
+        """Construit le classement à partir de tous les portefeuilles (un seul parcours, en tâche de fond).
+
+        Les portefeuilles en mémoire sont pris sur la boucle ; les autres sont
+        lus dans un thread avec read_wallet, sans effet de bord sur le stockage.
+        Un utilisateur déjà classé n'est pas relu. keep(user_id) permet un
+        nouveau parcours périodique : seuls les utilisateurs déjà classés pour
+        lesquels keep est vrai (ceux dont ce processus voit les trades) gardent
+        leur valeur, les autres sont relus.
+        """
+        cached = wallets.cached_wallets()
+        store = wallets.store
+
+        def load_all():
+            snapshots = []
+            for user_id in store.user_ids():
+                user_id = str(user_id)
+                if user_id in cached:
+                    continue
+                try:
+                    snapshots.append((user_id, store.read_wallet(user_id)))
+                except Exception as e:
+                    logging.error(f"Error loading wallet {user_id} for leaderboard: {e}")
+            return snapshots
+
+        for user_id, wallet in [*cached.items(), *await asyncio.to_thread(load_all)]:
+            # Un trade pendant le parcours a déjà donné une valeur plus récente
+            if user_id not in self._scores or (keep is not None and not keep(user_id)):
+                self.record_wallet(user_id, wallet)
+
+    def top(self, count):
+        """Retourne [(user_id, score)] des count meilleurs traders."""
+        return [(user_id, -score) for score, user_id in self._ranking[:count]]
+
+    def rank(self, user_id):
+        """Retourne (rang à partir de 1, score) d'un utilisateur, ou (None, None)."""
+        user_id = str(user_id)
+        score = self._scores.get(user_id)
+        if score is None:
+            return None, None
+        return bisect.bisect_left(self._ranking, (-score, user_id)) + 1, score
+
+
+leaderboard = Leaderboard()
+price_feed.subscribe(leaderboard.on_price)
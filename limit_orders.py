@@ -0,0 +1,247 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+import constants
+
+
+# Types d'ordres : côté du carnet et sens du déclenchement
+ORDER_KINDS = {
+    "limit": ("buy", "below"),  # achat quand le prix descend sous le seuil
+    "take_profit": ("sell", "above"),  # vente quand le prix monte au-dessus du seuil
+    "stop_loss": ("sell", "below"),  # vente quand le prix descend sous le seuil
+}
+
+
+class OrderBook:
+    """Ordres ouverts indexés par token, triés par prix de déclenchement.
+
+    Pour chaque token, un tas-max contient les ordres déclenchés à la
+    baisse et un tas-min ceux déclenchés à la hausse : un tick de prix ne
+    parcourt que les ordres effectivement déclenchés (O(k log n)).
+
+    Le fichier est un journal JSON Lines en ajout seul ({"add": ordre} ou
+    {"remove": id}) : une opération n'écrit qu'une ligne, et le journal est
+    compacté quand il dépasse COMPACT_FACTOR fois le nombre d'ordres.
+    Les anciens fichiers (liste JSON) sont convertis au chargement.
+
+    Rien n'est lu à la construction : open() charge le carnet, au démarrage.
+    Si path n'existe pas encore, le carnet est initialisé depuis seed_path
+    en ne gardant que les ordres des utilisateurs pour lesquels owns(user_id)
+    est vrai (carnet d'un worker repris de l'ancien carnet commun).
+    """
+
+    COMPACT_FACTOR = 4
+    COMPACT_MIN_ENTRIES = 1000
+
+    def __init__(self, path=None, seed_path=None, owns=None):
+        self.path = path
+        self.seed_path = seed_path
+        self.owns = owns
+        self.orders = {}  # id -> ordre
+        self._executing = {}  # id -> ordre déclenché, retiré du journal seulement une fois exécuté
+        self._below = defaultdict(list)  # adresse -> tas de (-seuil, id)
+        self._above = defaultdict(list)  # adresse -> tas de (seuil, id)
+        self._journal_entries = 0
+
+    def open(self):
+        """Charge le carnet depuis son journal (appel bloquant) ; par défaut LIMIT_ORDERS_DIR/orders.json."""
+        if self.path is None:
+            self.path = os.path.join(constants.LIMIT_ORDERS_DIR, "orders.json")
+        if os.path.exists(self.path) or self.seed_path is None:
+            self._load(self.path)
+        else:
+            self._load(self.seed_path, self.owns)
+            if self.orders:
+                self._compact()
+
+    def _load(self, path, owns=None):
+        if not os.path.exists(path):
+            return
+        try:
+            orders, legacy = _read_orders(path)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading limit orders from {path}: {e}")
+            return
+        for order in orders:
+            if owns is None or owns(order["user_id"]):
+                self._index(order)
+        if path == self.path:
+            self._journal_entries = len(orders)
+            if legacy:
+                self._compact()
+
+    def _append(self, *entries):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.path, "a") as file:
+            file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        self._journal_entries += len(entries)
+        if self._journal_entries > max(self.COMPACT_FACTOR * len(self.orders), self.COMPACT_MIN_ENTRIES):
+            self._compact()
+
+    def _compact(self):
+        """Réécrit le journal avec les seuls ordres encore ouverts et reconstruit les tas (coût amorti sur les ajouts).
+
+        Les tas sont reconstruits depuis les ordres ouverts : les entrées des
+        ordres annulés n'y restent pas indéfiniment.
+        """
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        live = [*self.orders.values(), *self._executing.values()]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write("".join(json.dumps({"add": order}) + "\n" for order in live))
+        os.replace(tmp_path, self.path)
+        self._journal_entries = len(live)
+        self._below.clear()
+        self._above.clear()
+        for order in list(self.orders.values()):
+            self._index(order)
+
+    def _index(self, order):
+        self.orders[order["id"]] = order
+        _, direction = ORDER_KINDS[order["kind"]]
+        if direction == "below":
+            heapq.heappush(self._below[order["contract_address"]], (-order["trigger_price"], order["id"]))
+        else:
+            heapq.heappush(self._above[order["contract_address"]], (order["trigger_price"], order["id"]))
+
+    def add(self, user_id, contract_address, kind, trigger_price, amount):
+        """Crée un ordre ; amount est en SOL pour un achat, en tokens ou en % pour une vente."""
+        side, _ = ORDER_KINDS[kind]
+        order = {
+            "id": uuid.uuid4().hex[:8],
+            "user_id": user_id,
+            "contract_address": contract_address,
+            "kind": kind,
+            "side": side,
+            "trigger_price": float(trigger_price),
+            "amount": amount,
+            "created_at": time.time(),
+        }
+        self._index(order)
+        self._append({"add": order})
+        return order
+
+    def cancel(self, order_id, user_id):
+        """Annule un ordre de l'utilisateur (suppression paresseuse dans les tas, purgés au compactage)."""
+        order = self.orders.get(order_id)
+        if order is None or order["user_id"] != user_id:
+            return False
+        del self.orders[order_id]
+        self._append({"remove": order_id})
+        return True
+
+    def orders_for(self, user_id):
+        """Retourne les ordres ouverts d'un utilisateur."""
+        return [order for order in self.orders.values() if order["user_id"] == user_id]
+
+    def contract_addresses(self):
+        """Retourne les tokens ayant au moins un ordre ouvert."""
+        return {order["contract_address"] for order in self.orders.values()}
+
+    def on_price(self, contract_address, price):
+        """Retire du carnet et retourne les ordres déclenchés par ce prix.
+
+        Ils restent dans le journal jusqu'à complete() ; release() les remet
+        dans le carnet si leur exécution échoue.
+        """
+        triggered = []
+        below = self._below.get(contract_address)
+        while below and -below[0][0] >= price:
+            _, order_id = heapq.heappop(below)
+            if order_id in self.orders:
+                triggered.append(self.orders.pop(order_id))
+        above = self._above.get(contract_address)
+        while above and above[0][0] <= price:
+            _, order_id = heapq.heappop(above)
+            if order_id in self.orders:
+                triggered.append(self.orders.pop(order_id))
+        for order in triggered:
+            self._executing[order["id"]] = order
+        return triggered
+
+    def complete(self, order):
+        """Retire définitivement un ordre exécuté."""
+        self._executing.pop(order["id"], None)
+        self._append({"remove": order["id"]})
+
+    def release(self, order):
+        """Remet dans le carnet un ordre dont l'exécution a échoué."""
+        self._executing.pop(order["id"], None)
+        self._index(order)
+
+
+def _read_orders(path):
+    """Retourne (ordres, ancien format) : rejoue le journal, ou lit une ancienne liste JSON."""
+    with open(path, "r") as file:
+        content = file.read()
+    if content.lstrip().startswith("["):
+        return json.loads(content), True
+    orders = {}
+    for line in content.splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            break  # ligne tronquée par un arrêt brutal : on garde ce qui précède
+        if "add" in entry:
+            orders[entry["add"]["id"]] = entry["add"]
+        else:
+            orders.pop(entry["remove"], None)
+    return list(orders.values()), False
+
+
+# Résultats de buy_token / sell_token qui ne sont pas définitifs : l'ordre est retenté
+RETRYABLE_RESULTS = ("Unable to fetch",)
+
+
+class LimitOrderEngine:
+    """Exécute les ordres déclenchés par le flux de prix via buy_token / sell_token."""
+
+    def __init__(self, book, buy, sell):
+        self.book = book
+        self.buy = buy
+        self.sell = sell
+        self.notify = None  # coroutine notify(user_id, message), fournie par le bot
+        self._tasks = set()
+
+    def on_price(self, contract_address, price):
+        """Abonné du flux de prix : lance l'exécution des ordres déclenchés."""
+        for order in self.book.on_price(contract_address, float(price)):
+            task = asyncio.create_task(self.execute(order, price))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def execute(self, order, price):
+        """Exécute un ordre déclenché avec la même comptabilité que les trades manuels.
+
+        Si l'exécution lève une exception ou si le prix est indisponible,
+        l'ordre retourne dans le carnet (l'utilisateur est prévenu au premier
+        échec) ; sinon il est retiré, le résultat du trade étant notifié.
+        """
+        label = order["kind"].replace("_", " ").title()
+        try:
+            if order["side"] == "buy":
+                result = await self.buy(order["user_id"], order["contract_address"], order["amount"])
+            else:
+                result = await self.sell(order["user_id"], order["contract_address"], order["amount"])
+        except Exception as e:
+            logging.error(f"Error executing {order['kind']} order {order['id']}: {e}")
+            result = None
+        if result is None or result.startswith(RETRYABLE_RESULTS):
+            order["failures"] = order.get("failures", 0) + 1
+            self.book.release(order)
+            if order["failures"] == 1 and self.notify is not None:
+                await self.notify(order["user_id"], f"⚠️ {label} order triggered at ${price} but could not be filled. It stays open and will be retried.")
+            return
+        self.book.complete(order)
+        logging.info(f"Executed {order['kind']} order {order['id']} at ${price}: {result}")
+        if self.notify is not None:
+            await self.notify(order["user_id"], f"⚡ {label} order triggered at ${price}\n{result}")
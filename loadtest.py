@@ -0,0 +1,185 @@
+"""Banc de charge : injecte des Update synthétiques dans l'application et mesure débit et latence.
+
+Aucun appel réseau : l'API Telegram est simulée par FakeTelegramRequest et
+les données de marché sont préchargées dans les caches.
+
+    python loadtest.py --users 200 --updates 10 --api-latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import constants
+
+# Les fichiers du banc vont dans un dossier temporaire, avant l'import des autres modules
+_workdir = tempfile.mkdtemp(prefix="loadtest_")
+constants.WALLETS_DIR = os.path.join(_workdir, "wallets")
+constants.HISTORY_DIR = os.path.join(_workdir, "history")
+constants.LIMIT_ORDERS_DIR = os.path.join(_workdir, "limit_orders")
+constants.WALLETS_DB = os.path.join(_workdir, "wallets.db")
+constants.TOKEN_METADATA_FILE = os.path.join(_workdir, "token_metadata.json")
+constants.PRICE_HISTORY_DIR = os.path.join(_workdir, "price_history")
+constants.MARKET_SNAPSHOT_FILE = os.path.join(_workdir, "market_snapshot.jsonl")
+constants.METRICS_PORT = 0
+
+from telegram import Update  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+from main import build_application  # noqa: E402
+from market_cache import market_cache  # noqa: E402
+from token_metadata import token_metadata  # noqa: E402
+from update_processor import UserOrderedUpdateProcessor  # noqa: E402
+from utils import wallet_cache  # noqa: E402
+
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "LoadTest", "username": "loadtest_bot"}
+
+
+class FakeTelegramRequest(BaseRequest):
+    """Simule l'API Bot de Telegram avec une latence fixe."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._message_id = 1000
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        endpoint = url.rsplit("/", 1)[-1]
+        parameters = request_data.parameters if request_data is not None else {}
+        if endpoint == "getMe":
+            result = BOT_USER
+        elif endpoint in ("sendMessage", "editMessageText", "editMessageReplyMarkup"):
+            self._message_id += 1
+            result = {
+                "message_id": parameters.get("message_id", self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": parameters.get("chat_id", 0), "type": "private"},
+                "from": BOT_USER,
+                "text": parameters.get("text", ""),
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class TimedUpdateProcessor(UserOrderedUpdateProcessor):
+    """Processeur qui mesure le temps entre la mise en file et la fin du traitement."""
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self.enqueued_at = {}
+        self.latencies = []
+        self.done = asyncio.Event()
+        self.expected = 0
+
+    async def do_process_update(self, update, coroutine):
+        await super().do_process_update(update, coroutine)
+        self.latencies.append(time.perf_counter() - self.enqueued_at.pop(update.update_id))
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+def seed_market_data(token_count):
+    """Précharge prix et métadonnées de tokens fictifs : aucun appel aux APIs de marché."""
+    addresses = [f"Token{i:040d}" for i in range(token_count)]
+    market_cache.set(("sol_price",), 150.0)
+    token_metadata.set_many({ca: (f"Token {i}", 1_000_000_000, 6) for i, ca in enumerate(addresses)})
+    for i, ca in enumerate(addresses):
+        market_cache.set(("price", ca), 0.001 * (i + 1))
+    return addresses
+
+
+def seed_wallets(user_ids, addresses, positions):
+    for user_id in user_ids:
+        tokens = {
+            ca: {"name": f"Token {i}", "quantity": 1000 + i, "purchase_market_cap": 1_000_000, "purchase_price": 0.001,
+                 "sol_spent": 1, "sol_sold": 0}
+            for i, ca in enumerate(addresses[:positions])
+        }
+        wallet_cache.save(user_id, {"sol_balance": 100, "tokens": tokens, "general_pnl": 0})
+
+
+def synthetic_update(update_id, user_id, kind):
+    user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+    chat = {"id": user_id, "type": "private"}
+    if kind == "start":
+        return {"update_id": update_id, "message": {
+            "message_id": update_id, "date": int(time.time()), "chat": chat, "from": user,
+            "text": "/start", "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        }}
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "from": user, "chat_instance": str(user_id), "data": kind,
+        "message": {"message_id": update_id, "date": int(time.time()), "chat": chat, "from": BOT_USER, "text": "menu"},
+    }}
+
+
+async def run(users, updates_per_user, api_latency, concurrency, positions, seed_market=True):
+    request = FakeTelegramRequest(api_latency)
+    processor = TimedUpdateProcessor(concurrency)
+    application = build_application(token="123456:loadtest", request=request, update_processor=processor, schedule_jobs=False)
+
+    if seed_market:
+        addresses = seed_market_data(max(positions, 1))
+    else:
+        # Les prix et métadonnées viendront des APIs de marché (ex. simulées par bench.py)
+        addresses = [f"Token{i:040d}" for i in range(max(positions, 1))]
+    user_ids = list(range(10_000, 10_000 + users))
+    seed_wallets(user_ids, addresses, positions)
+    scenario = ["start", "show_balance", "sell_token", "back_to_menu", "show_history"]
+
+    async with application:
+        await application.start()
+        processor.expected = users * updates_per_user
+        started = time.perf_counter()
+        update_id = 0
+        for step in range(updates_per_user):
+            for user_id in user_ids:
+                update_id += 1
+                update = Update.de_json(synthetic_update(update_id, user_id, scenario[step % len(scenario)]), application.bot)
+                processor.enqueued_at[update_id] = time.perf_counter()
+                await application.update_queue.put(update)
+        await processor.done.wait()
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    latencies = sorted(processor.latencies)
+    return {
+        "updates": len(latencies),
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000, 2),
+        "telegram_calls": request.calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--updates", type=int, default=10, help="mises à jour par utilisateur")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="latence simulée de l'API Telegram (s)")
+    parser.add_argument("--concurrency", type=int, default=constants.CONCURRENT_UPDATES)
+    parser.add_argument("--positions", type=int, default=5, help="tokens par portefeuille")
+    args = parser.parse_args()
+    result = asyncio.run(run(args.users, args.updates, args.api_latency, args.concurrency, args.positions))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
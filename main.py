@@ -1,12 +1,38 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes, filters
-from trading_bot import add_sol, buy_token, sell_token, show_balance, get_token_information, refresh_token_info, load_wallet, get_sol_price, get_transaction_history
-from constants import TELEGRAM_BOT_TOKEN
-from utils import format_large_number, cache
+from telegram.request import HTTPXRequest
+from trading_bot import add_sol, buy_token, sell_token, buy_tokens, sell_all_tokens, show_balance, get_token_information, get_tokens_information, refresh_token_info, load_wallet, get_sol_price, get_transaction_history, get_stats_message, get_leaderboard_message, open_order_book, order_book, order_engine
+from leaderboard import leaderboard
+from market_cache import market_cache
+from market_snapshot import market_snapshot
+from portfolio import position_pnl
+from market_data import close_client, get_client, refresh_token_prices, invalidate_sol_price, invalidate_token_information
+from config import get_config
+import constants
+from constants import (
+    WALLET_FLUSH_INTERVAL, LIMIT_ORDER_CHECK_INTERVAL, PRICE_REFRESH_TICK,
+    LIVE_BALANCE_INTERVAL, LIVE_BALANCE_DURATION, REFRESH_COOLDOWN,
+    LEADERBOARD_MTM_INTERVAL, LEADERBOARD_REBUILD_INTERVAL, PRICE_HISTORY_FLUSH_INTERVAL, MARKET_SNAPSHOT_INTERVAL,
+    TOKEN_METADATA_FLUSH_INTERVAL,
+)
+from metrics import gauge, instrument_handler, perf_report, start_metrics_server, telegram_seconds
+from price_history import price_history
+from token_metadata import token_metadata
+from price_refresher import price_refresher
+from rate_limiter import PRIORITY_BACKGROUND, priority
+from rendering import BACK_TO_MENU_BUTTON, MAIN_MENU_KEYBOARD, NAVIGATION_KEYBOARD, balance_keyboard, history_keyboard, render_welcome
+from sharding import build_router, shard_for
+from update_processor import UserOrderedUpdateProcessor
+from utils import format_large_number, wallet_cache
+import asyncio
 import os
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Commandes de création d'ordres -> type d'ordre
+ORDER_COMMANDS = {"limit": "limit", "tp": "take_profit", "sl": "stop_loss"}
 
 # Réduire les états en supprimant ceux des limit orders
 (
@@ -18,35 +44,54 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
     STATE_SELL_TOKEN_AMOUNT,
 ) = range(6)
 
+class InstrumentedRequest(HTTPXRequest):
+    """Requêtes vers l'API Bot de Telegram, chronométrées par méthode."""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        with telegram_seconds.time(method=url.rsplit("/", 1)[-1]):
+            return await super().do_request(url, method, request_data, **kwargs)
+
+# Portefeuilles modifiés pas encore écrits sur disque, lus à chaque export
+gauge("wallets_pending_write", "Portefeuilles en attente d'écriture", wallet_cache.dirty_count)
+
+def stop_live_balance(context: ContextTypes.DEFAULT_TYPE, chat_id):
+    """Arrête la mise à jour en direct du solde dans ce chat."""
+    for job in context.job_queue.get_jobs_by_name(f"live_balance_{chat_id}"):
+        job.schedule_removal()
+
+async def update_live_balance(context: ContextTypes.DEFAULT_TYPE):
+    """Met à jour le message de solde en direct, seulement si son contenu a changé."""
+    job = context.job
+    if time.monotonic() > job.data["expires_at"]:
+        job.schedule_removal()
+        await context.bot.edit_message_reply_markup(job.chat_id, job.data["message_id"], reply_markup=balance_keyboard(False, job.data["page"], job.data["page_count"]))
+        return
+    balance_message, page_count = await show_balance(job.user_id, job.data["page"])
+    if balance_message == job.data["last_message"]:
+        return
+    try:
+        await context.bot.edit_message_text(
+            balance_message,
+            chat_id=job.chat_id,
+            message_id=job.data["message_id"],
+            reply_markup=balance_keyboard(True, job.data["page"], page_count),
+            parse_mode="Markdown"
+        )
+        job.data["last_message"] = balance_message
+        job.data["page_count"] = page_count
+        context.user_data["last_balance"] = (job.data["message_id"], balance_message)
+    except BadRequest as e:
+        # Message supprimé ou devenu non modifiable : on arrête le direct
+        logging.warning(f"Stopping live balance in chat {job.chat_id}: {e}")
+        job.schedule_removal()
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    wallet = load_wallet(user_id)
-    sol_balance = wallet["sol_balance"]
-    sol_price = get_sol_price() or 0
-    general_pnl = wallet.get("general_pnl", 0)
-    pnl_display = f"+{general_pnl:.2f}" if general_pnl >= 0 else f"{general_pnl:.2f}"
-
-    keyboard = [
-        [
-            InlineKeyboardButton("➕ Add SOL", callback_data="add_sol"),
-            InlineKeyboardButton("💰 Show Balance", callback_data="show_balance")
-        ],
-        [
-            InlineKeyboardButton("🛒 Buy Token", callback_data="buy_token"),
-            InlineKeyboardButton("📉 Sell Token", callback_data="sell_token")
-        ],
-        [
-            InlineKeyboardButton("📜 History", callback_data="show_history")  # Suppression de "Set Limit Order"
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    wallet = await load_wallet(user_id)
+    sol_price = await get_sol_price() or 0
     await update.message.reply_text(
-        f"🚀 *Welcome to the Cudly Train Trading Bot!* 🚀\n\n"
-        f"SOL Balance: {sol_balance:.2f} SOL (${sol_balance * sol_price:.2f})\n"
-        f"PNL wallet: {pnl_display} SOL (${general_pnl * sol_price:.2f})\n\n"
-        "Select an option below to get started:",
-        reply_markup=reply_markup,
+        render_welcome(wallet, sol_price),
+        reply_markup=MAIN_MENU_KEYBOARD,
         parse_mode="Markdown",
         disable_web_page_preview=True
     )
@@ -59,11 +104,14 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = query.message.chat_id
     message_id = query.message.message_id
 
-    if query.data == "show_history":
-        history_message = get_transaction_history(user_id)
-        keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_menu")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(history_message, reply_markup=reply_markup, parse_mode="Markdown")
+    # Toute autre action sur le message arrête sa mise à jour en direct
+    if query.data != "live_balance":
+        stop_live_balance(context, chat_id)
+
+    if query.data == "show_history" or query.data.startswith("history_"):
+        page = int(query.data.split("history_")[1]) if query.data.startswith("history_") else 0
+        history_message, page_count = await get_transaction_history(user_id, page)
+        await query.edit_message_text(history_message, reply_markup=history_keyboard(page, page_count), parse_mode="Markdown")
 
     elif query.data == "add_sol":
         msg = await context.bot.send_message(chat_id, "Please enter the amount of SOL to add:")
@@ -76,20 +124,20 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["state"] = STATE_BUY_TOKEN_CA
 
     elif query.data == "sell_token":
-        wallet = load_wallet(user_id)
+        wallet = await load_wallet(user_id)
         if not wallet.get("tokens"):
             await context.bot.send_message(chat_id, "No tokens available to sell.")
             return
         keyboard = []
+        token_infos = await get_tokens_information(wallet["tokens"].keys())
         for ca, data in wallet["tokens"].items():
-            token_price, market_cap, _ = get_token_information(ca)
+            token_price, market_cap, _ = token_infos[ca]
             if token_price and market_cap:
-                pnl = (market_cap - data['purchase_market_cap']) / data['purchase_market_cap'] * 100 if data['purchase_market_cap'] else 0
-                profit_loss = (pnl * data['sol_spent']) / 100 if data['sol_spent'] else 0
+                _, profit_loss = position_pnl(data, market_cap)
                 pnl_display = f"+{profit_loss:.2f}" if profit_loss >= 0 else f"{profit_loss:.2f}"
                 button_text = f"{data['name']} ({format_large_number(data['quantity'])}) {pnl_display} SOL"
                 keyboard.append([InlineKeyboardButton(button_text, callback_data=f"sell_{ca}")])
-        keyboard.append([InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_menu")])
+        keyboard.append([BACK_TO_MENU_BUTTON])
         reply_markup = InlineKeyboardMarkup(keyboard)
         await context.bot.send_message(chat_id, "Select a token to sell:", reply_markup=reply_markup)
         await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
@@ -97,9 +145,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data.startswith("sell_"):
         ca = query.data.split("sell_")[1]
         context.user_data["contract_address"] = ca
-        wallet = load_wallet(user_id)
+        wallet = await load_wallet(user_id)
         token_data = wallet["tokens"][ca]
-        token_price, _, token_name = get_token_information(ca)
+        token_price, _, token_name = await get_token_information(ca)
         if token_price:
             msg = await context.bot.send_message(chat_id, f"Token: {token_name}\nBalance: {format_large_number(token_data['quantity'])}\nEnter amount to sell:")
             context.user_data["last_message_id"] = msg.message_id
@@ -108,55 +156,70 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             await context.bot.send_message(chat_id, "Unable to fetch token info. Try again.")
 
-    elif query.data == "show_balance":
-        balance_message = show_balance(user_id)
-        keyboard = [
-            [InlineKeyboardButton("🔄 Refresh", callback_data="refresh_balance")],
-            [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(balance_message, reply_markup=reply_markup, parse_mode="Markdown")
+    elif query.data in ("show_balance", "back_to_balance") or query.data.startswith("balance_page_"):
+        page = int(query.data.split("balance_page_")[1]) if query.data.startswith("balance_page_") else 0
+        context.user_data["balance_page"] = page
+        balance_message, page_count = await show_balance(user_id, page)
+        context.user_data["balance_page_count"] = page_count
+        await query.edit_message_text(balance_message, reply_markup=balance_keyboard(False, page, page_count), parse_mode="Markdown")
+        context.user_data["last_balance"] = (message_id, balance_message)
 
     elif query.data == "refresh_balance":
-        cache.clear()
-        balance_message = show_balance(user_id)
-        keyboard = [
-            [InlineKeyboardButton("🔄 Refresh", callback_data="refresh_balance")],
-            [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(balance_message, reply_markup=reply_markup, parse_mode="Markdown")
+        # Invalide uniquement les données affichées par ce portefeuille, au plus
+        # une fois par REFRESH_COOLDOWN : les clics répétés relisent le cache
+        now = time.monotonic()
+        if now - context.user_data.get("last_refresh", 0) >= REFRESH_COOLDOWN:
+            context.user_data["last_refresh"] = now
+            invalidate_sol_price()
+            for ca in (await load_wallet(user_id)).get("tokens", {}):
+                invalidate_token_information(ca)
+        page = context.user_data.get("balance_page", 0)
+        balance_message, page_count = await show_balance(user_id, page)
+        # Compare au dernier texte Markdown envoyé pour ce message : query.message.text
+        # est la version rendue par Telegram, jamais égale à la source
+        if context.user_data.get("last_balance") != (message_id, balance_message):
+            await query.edit_message_text(balance_message, reply_markup=balance_keyboard(False, page, page_count), parse_mode="Markdown")
+            context.user_data["last_balance"] = (message_id, balance_message)
+
+    elif query.data == "live_balance":
+        page = context.user_data.get("balance_page", 0)
+        balance_message, page_count = await show_balance(user_id, page)
+        stop_live_balance(context, chat_id)
+        context.job_queue.run_repeating(
+            update_live_balance,
+            interval=LIVE_BALANCE_INTERVAL,
+            first=LIVE_BALANCE_INTERVAL,
+            chat_id=chat_id,
+            user_id=user_id,
+            name=f"live_balance_{chat_id}",
+            data={
+                "message_id": message_id, "last_message": balance_message, "page": page, "page_count": page_count,
+                "expires_at": time.monotonic() + LIVE_BALANCE_DURATION,
+            },
+        )
+        await query.edit_message_text(balance_message, reply_markup=balance_keyboard(True, page, page_count), parse_mode="Markdown")
+        context.user_data["last_balance"] = (message_id, balance_message)
+
+    elif query.data == "stop_live":
+        page = context.user_data.get("balance_page", 0)
+        await query.edit_message_reply_markup(reply_markup=balance_keyboard(False, page, context.user_data.get("balance_page_count", 1)))
 
     elif query.data == "back_to_menu":
-        wallet = load_wallet(user_id)
-        sol_balance = wallet["sol_balance"]
-        sol_price = get_sol_price() or 0
-        general_pnl = wallet.get("general_pnl", 0)
-        pnl_display = f"+{general_pnl:.2f}" if general_pnl >= 0 else f"{general_pnl:.2f}"
-        keyboard = [
-            [InlineKeyboardButton("➕ Add SOL", callback_data="add_sol"), InlineKeyboardButton("💰 Show Balance", callback_data="show_balance")],
-            [InlineKeyboardButton("🛒 Buy Token", callback_data="buy_token"), InlineKeyboardButton("📉 Sell Token", callback_data="sell_token")],
-            [InlineKeyboardButton("📜 History", callback_data="show_history")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        wallet = await load_wallet(user_id)
+        sol_price = await get_sol_price() or 0
         await query.edit_message_text(
-            f"🚀 *Welcome to the Cudly Train Trading Bot!* 🚀\n\n"
-            f"SOL Balance: {sol_balance:.2f} SOL (${sol_balance * sol_price:.2f})\n"
-            f"PNL wallet: {pnl_display} SOL (${general_pnl * sol_price:.2f})\n\n"
-            "Select an option below to get started:",
-            reply_markup=reply_markup,
+            render_welcome(wallet, sol_price),
+            reply_markup=MAIN_MENU_KEYBOARD,
             parse_mode="Markdown",
             disable_web_page_preview=True
         )
 
-    elif query.data == "back_to_balance":
-        balance_message = show_balance(user_id)
-        keyboard = [
-            [InlineKeyboardButton("🔄 Refresh", callback_data="refresh_balance")],
-            [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(balance_message, reply_markup=reply_markup, parse_mode="Markdown")
+    elif query.data.startswith("cancel_order_"):
+        order_id = query.data.split("cancel_order_")[1]
+        if order_book.cancel(order_id, user_id):
+            await context.bot.send_message(chat_id, f"Order {order_id} cancelled.")
+        else:
+            await context.bot.send_message(chat_id, "Order not found or already executed.")
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
@@ -175,20 +238,16 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await context.bot.delete_message(chat_id=chat_id, message_id=last_message_id)
         await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
 
-        keyboard = [
-            [InlineKeyboardButton("💰 Back to Balance", callback_data="back_to_balance"),
-             InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = NAVIGATION_KEYBOARD
 
         if state == STATE_ADD_SOL:
-            response = add_sol(user_id, text)
+            response = await add_sol(user_id, text)
             await context.bot.send_message(chat_id, response, reply_markup=reply_markup)
             context.user_data["state"] = STATE_IDLE
 
         elif state == STATE_BUY_TOKEN_CA:
             context.user_data["contract_address"] = text
-            token_price, market_cap, token_name = get_token_information(text)
+            token_price, market_cap, token_name = await get_token_information(text)
             if token_price:
                 msg = await context.bot.send_message(chat_id, "Please enter the amount of SOL you want to spend:")
                 context.user_data["last_message_id"] = msg.message_id
@@ -198,13 +257,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         elif state == STATE_BUY_TOKEN_AMOUNT:
             contract_address = context.user_data["contract_address"]
-            response = buy_token(user_id, contract_address, text)
+            response = await buy_token(user_id, contract_address, text)
             await context.bot.send_message(chat_id, response, reply_markup=reply_markup)
             context.user_data["state"] = STATE_IDLE
 
         elif state == STATE_SELL_TOKEN_AMOUNT:
             contract_address = context.user_data["contract_address"]
-            response = sell_token(user_id, contract_address, text)
+            response = await sell_token(user_id, contract_address, text)
             await context.bot.send_message(chat_id, response, reply_markup=reply_markup)
             context.user_data["state"] = STATE_IDLE
 
@@ -212,22 +271,245 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await context.bot.send_message(chat_id, "Please select an option from the menu.", reply_markup=reply_markup)
 
     except Exception as e:
-        keyboard = [
-            [InlineKeyboardButton("💰 Back to Balance", callback_data="back_to_balance"),
-             InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await context.bot.send_message(chat_id, f"Error: {str(e)}. Please try again.", reply_markup=reply_markup)
+        await context.bot.send_message(chat_id, f"Error: {str(e)}. Please try again.", reply_markup=NAVIGATION_KEYBOARD)
         context.user_data["state"] = STATE_IDLE
 
+async def place_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/limit <CA> <prix> <SOL>, /tp <CA> <prix> <quantité|%>, /sl <CA> <prix> <quantité|%>"""
+    user_id = update.message.from_user.id
+    command = update.message.text.split()[0][1:].split("@")[0]
+    kind = ORDER_COMMANDS[command]
+    if len(context.args) != 3:
+        amount_hint = "SOL amount" if kind == "limit" else "token amount or %"
+        await update.message.reply_text(f"Usage: /{command} <contract address> <trigger price USD> <{amount_hint}>")
+        return
+
+    contract_address, trigger, amount = context.args
+    try:
+        trigger_price = float(trigger)
+        value = float(amount.replace("%", "").strip())
+        if trigger_price <= 0 or value <= 0 or ("%" in amount and (kind == "limit" or value > 100)):
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("Invalid price or amount. Please enter valid numbers.")
+        return
+
+    if kind != "limit" and contract_address not in (await load_wallet(user_id))["tokens"]:
+        await update.message.reply_text(f"No tokens found for contract address: {contract_address}")
+        return
+    token_price, _, token_name = await get_token_information(contract_address)
+    if not token_price:
+        await update.message.reply_text("Unable to fetch token information. Please try again.")
+        return
+
+    order = order_book.add(user_id, contract_address, kind, trigger_price, amount)
+    label = kind.replace("_", " ").title()
+    await update.message.reply_text(
+        f"✅ {label} order {order['id']} set for {token_name}\n"
+        f"Trigger price: ${trigger_price}\n"
+        f"Current price: ${token_price}\n"
+        f"Amount: {amount}{' SOL' if kind == 'limit' else ''}"
+    )
+
+async def buy_batch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/buy <CA>:<SOL> [<CA>:<SOL> ...] : achète plusieurs tokens en une seule opération."""
+    orders = [arg.rsplit(":", 1) for arg in context.args]
+    if not orders or any(len(order) != 2 or not order[0] for order in orders):
+        await update.message.reply_text("Usage: /buy <contract address>:<SOL amount> [<contract address>:<SOL amount> ...]")
+        return
+    await update.message.reply_text(await buy_tokens(update.message.from_user.id, orders))
+
+async def sell_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/sellall <pourcentage> : vend le même pourcentage de chaque position."""
+    if len(context.args) != 1:
+        await update.message.reply_text("Usage: /sellall <percentage>, e.g. /sellall 50%")
+        return
+    await update.message.reply_text(await sell_all_tokens(update.message.from_user.id, context.args[0]))
+
+async def list_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/orders : liste les ordres ouverts avec un bouton d'annulation."""
+    orders = order_book.orders_for(update.message.from_user.id)
+    if not orders:
+        await update.message.reply_text("No open orders.")
+        return
+    keyboard = [
+        [InlineKeyboardButton(f"❌ {order['kind'].replace('_', ' ').title()} @ ${order['trigger_price']} ({order['amount']})", callback_data=f"cancel_order_{order['id']}")]
+        for order in orders
+    ]
+    await update.message.reply_text("📋 Open orders (tap to cancel):", reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/stats : statistiques de trading de l'utilisateur."""
+    await update.message.reply_text(await get_stats_message(update.message.from_user.id))
+
+async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/leaderboard : meilleurs traders et rang de l'utilisateur."""
+    await update.message.reply_text(get_leaderboard_message(update.message.from_user.id))
+
+async def show_perf(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/perf : résumé des métriques de performance (administrateurs uniquement)."""
+    if update.message.from_user.id not in constants.ADMIN_IDS:
+        return
+    await update.message.reply_text(perf_report())
+
+async def check_limit_orders(context: ContextTypes.DEFAULT_TYPE):
+    """Rafraîchit en une requête groupée les prix des tokens ayant des ordres ouverts."""
+    contract_addresses = order_book.contract_addresses()
+    if contract_addresses:
+        with priority(PRIORITY_BACKGROUND):
+            await refresh_token_prices(contract_addresses)
+
+async def flush_wallets(context: ContextTypes.DEFAULT_TYPE):
+    """Écrit sur disque les portefeuilles modifiés depuis le dernier passage."""
+    await wallet_cache.flush()
+
+async def refresh_prices(context: ContextTypes.DEFAULT_TYPE):
+    """Rafraîchit en arrière-plan les prix arrivés à échéance."""
+    await price_refresher.run_once()
+
+async def mark_leaderboard(context: ContextTypes.DEFAULT_TYPE):
+    """Revalorise le PNL latent du classement pour les tokens dont le prix a bougé."""
+    leaderboard.mark_to_market()
+
+async def build_leaderboard(context: ContextTypes.DEFAULT_TYPE):
+    """Construit le classement juste après le démarrage, sans retarder la réception des mises à jour."""
+    started = time.monotonic()
+    await leaderboard.rebuild(wallet_cache)
+    logging.info(f"Leaderboard built: {len(leaderboard)} traders in {time.monotonic() - started:.1f}s")
+
+async def rebuild_leaderboard(context: ContextTypes.DEFAULT_TYPE):
+    """Multi-processus : relit les portefeuilles des utilisateurs des autres workers."""
+    shard_index, workers = constants.SHARD_INDEX, constants.WORKERS
+    await leaderboard.rebuild(wallet_cache, keep=lambda user_id: shard_for(user_id, workers) == shard_index)
+
+async def flush_price_history(context: ContextTypes.DEFAULT_TYPE):
+    """Ajoute sur disque les ticks de prix reçus depuis le dernier passage."""
+    await price_history.flush_async()
+
+async def flush_token_metadata(context: ContextTypes.DEFAULT_TYPE):
+    """Écrit les métadonnées de tokens enregistrées depuis le dernier passage."""
+    await token_metadata.flush_async()
+
+async def save_market_snapshot(context: ContextTypes.DEFAULT_TYPE):
+    """Écrit l'instantané du cache de marché, rechargé au prochain démarrage."""
+    await market_snapshot.save_async()
+
+async def warm_up_market(context: ContextTypes.DEFAULT_TYPE):
+    """Préchauffe le cache avec les tokens détenus, juste après le démarrage."""
+    started = time.monotonic()
+    count = await price_refresher.warm_up()
+    logging.info(f"Market cache warmed up: {count} held tokens in {time.monotonic() - started:.1f}s")
+
+async def on_startup(application: Application):
+    """Ouvre le stockage, le cache partagé, le carnet d'ordres et le client HTTP, recharge les métadonnées de tokens et l'instantané du marché et sert les métriques.
+
+    Rien de tout cela n'est fait à l'import des modules (ni la lecture de la
+    configuration) : un worker démarre vite et une panne de stockage apparaît
+    au démarrage, pas à la première requête.
+    """
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=constants.BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+    )
+    await asyncio.to_thread(wallet_cache.store.open)
+    if market_cache.shared is not None:
+        await asyncio.to_thread(market_cache.shared.open)
+    await asyncio.to_thread(open_order_book)
+    get_client()
+    await token_metadata.load_async()
+    restored = await market_snapshot.load_async()
+    if restored:
+        logging.info(f"Restored {restored} market cache entries from the snapshot")
+    if constants.METRICS_PORT:
+        application.bot_data["metrics_server"] = await start_metrics_server(constants.METRICS_HOST, constants.METRICS_PORT)
+
+async def on_shutdown(application: Application):
+    """Écrit les portefeuilles, l'historique des prix, les métadonnées de tokens et l'instantané du marché, puis ferme le stockage et les connexions à l'arrêt du bot."""
+    await wallet_cache.flush()
+    await price_history.flush_async()
+    await token_metadata.flush_async()
+    await market_snapshot.save_async()
+    await close_client()
+    await asyncio.to_thread(wallet_cache.store.close)
+    if market_cache.shared is not None:
+        await asyncio.to_thread(market_cache.shared.close)
+    metrics_server = application.bot_data.pop("metrics_server", None)
+    if metrics_server is not None:
+        metrics_server.close()
+        await metrics_server.wait_closed()
+
+def build_application(token=None, request=None, update_processor=None, schedule_jobs=True):
+    """Construit l'application Telegram avec ses handlers et ses tâches de fond."""
+    builder = (
+        Application.builder()
+        .token(token or constants.TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(update_processor or UserOrderedUpdateProcessor(constants.CONCURRENT_UPDATES))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    builder = builder.request(request or InstrumentedRequest(connection_pool_size=256))
+    application = builder.build()
+
+    async def notify_user(user_id, message):
+        await application.bot.send_message(user_id, message)
+
+    order_engine.notify = notify_user
+
+    application.add_handler(CommandHandler("start", instrument_handler(start)))
+    application.add_handler(CommandHandler(list(ORDER_COMMANDS), instrument_handler(place_order)))
+    application.add_handler(CommandHandler("orders", instrument_handler(list_orders)))
+    application.add_handler(CommandHandler("buy", instrument_handler(buy_batch)))
+    application.add_handler(CommandHandler("sellall", instrument_handler(sell_all)))
+    application.add_handler(CommandHandler("stats", instrument_handler(show_stats)))
+    application.add_handler(CommandHandler("leaderboard", instrument_handler(show_leaderboard)))
+    application.add_handler(CommandHandler("perf", show_perf))
+    application.add_handler(CallbackQueryHandler(instrument_handler(button_handler)))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, instrument_handler(handle_message)))
+
+    if schedule_jobs:
+        application.job_queue.run_repeating(flush_wallets, interval=WALLET_FLUSH_INTERVAL, first=WALLET_FLUSH_INTERVAL)
+        application.job_queue.run_repeating(refresh_prices, interval=PRICE_REFRESH_TICK, first=PRICE_REFRESH_TICK)
+        application.job_queue.run_repeating(mark_leaderboard, interval=LEADERBOARD_MTM_INTERVAL, first=LEADERBOARD_MTM_INTERVAL)
+        if constants.SHARD_INDEX >= 0:
+            # Chaque worker ne voit que les trades de ses utilisateurs
+            application.job_queue.run_repeating(rebuild_leaderboard, interval=LEADERBOARD_REBUILD_INTERVAL, first=LEADERBOARD_REBUILD_INTERVAL)
+        application.job_queue.run_repeating(flush_price_history, interval=PRICE_HISTORY_FLUSH_INTERVAL, first=PRICE_HISTORY_FLUSH_INTERVAL)
+        application.job_queue.run_repeating(flush_token_metadata, interval=TOKEN_METADATA_FLUSH_INTERVAL, first=TOKEN_METADATA_FLUSH_INTERVAL)
+        application.job_queue.run_repeating(check_limit_orders, interval=LIMIT_ORDER_CHECK_INTERVAL, first=LIMIT_ORDER_CHECK_INTERVAL)
+        application.job_queue.run_repeating(save_market_snapshot, interval=MARKET_SNAPSHOT_INTERVAL, first=MARKET_SNAPSHOT_INTERVAL)
+        application.job_queue.run_once(warm_up_market, when=0)
+        application.job_queue.run_once(build_leaderboard, when=0)
+    return application
+
+def configure_logging():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    # httpx journalise chaque URL en INFO, y compris https://api.telegram.org/bot<TOKEN>/...
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
 def main():
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    configure_logging()
+    config = get_config()
+    config.check()
+    for warning in config.warnings:
+        logging.warning(warning)
+    logging.info(f"Starting bot: {config.summary()}")
 
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CallbackQueryHandler(button_handler))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    if config.workers:
+        # Mode multi-processus : ce processus reçoit les mises à jour et les répartit entre les workers
+        application = build_router(config.telegram_bot_token, config.workers)
+    else:
+        application = build_application()
 
-    application.run_polling()
+    if config.webhook_url:
+        # Mode production : Telegram pousse les mises à jour sur notre serveur
+        application.run_webhook(
+            listen=config.webhook_listen,
+            port=config.webhook_port,
+            url_path=config.webhook_path,
+            secret_token=config.webhook_secret,
+            webhook_url=f"{config.webhook_url.rstrip('/')}/{config.webhook_path}",
+        )
+    else:
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
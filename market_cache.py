@@ -0,0 +1,358 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from constants import CACHE_TTLS, CACHE_STALE_TTL, CACHE_MAXSIZE
+from metrics import cache_lookups
+from rate_limiter import PRIORITY_BACKGROUND, priority
+from shared_cache import create_shared_cache
+
+
+class SingleFlight:
+    """Regroupe les appels concurrents pour une même clé sur une seule requête en cours."""
+
+    def __init__(self):
+        self._calls = {}  # clé -> future de la requête en cours
+
+    async def do(self, key, fetcher):
+        """Exécute fetcher() une seule fois pour tous les appelants concurrents de key."""
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fetcher())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        # shield : l'annulation d'un appelant n'annule pas la requête partagée
+        return await asyncio.shield(future)
+
+    def start_many(self, keys, fetcher):
+        """Lance fetcher(clés) en une seule requête pour les clés sans requête en cours.
+
+        fetcher est une coroutine qui reçoit la liste des clés et retourne
+        {clé: valeur}. Retourne {clé: future} pour toutes les clés : les clés
+        déjà en cours (requête individuelle ou autre lot) partagent la future
+        existante au lieu d'être redemandées.
+        """
+        futures = {key: self._calls[key] for key in keys if key in self._calls}
+        new = [key for key in dict.fromkeys(keys) if key not in futures]
+        if new:
+            batch = asyncio.ensure_future(fetcher(new))
+            for key in new:
+                future = asyncio.ensure_future(_pick(batch, key))
+                self._calls[key] = future
+                future.add_done_callback(lambda done, key=key: self._forget(key, done))
+                futures[key] = future
+        return futures
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    def in_flight(self, key):
+        """Indique si une requête est en cours pour key."""
+        return key in self._calls
+
+
+async def _pick(batch, key):
+    # shield : l'annulation d'une clé n'annule pas le lot partagé
+    return (await asyncio.shield(batch)).get(key)
+
+
+class MarketCache:
+    """Cache partagé des données de marché, avec un TTL par type de donnée.
+
+    Les clés sont des tuples dont le premier élément est le type de donnée
+    (ex. ("token", adresse), ("sol_price",)). Une entrée expirée reste servie
+    pendant CACHE_STALE_TTL secondes pendant qu'un rafraîchissement tourne
+    en arrière-plan. Les requêtes concurrentes pour une même clé sont
+    regroupées en une seule.
+
+    Avec un cache partagé (shared, voir shared_cache.py), les valeurs
+    récupérées sont publiées pour les autres processus, et un défaut du
+    cache local le consulte avant d'interroger les APIs. shared_factory
+    permet de ne créer ce cache partagé qu'au premier accès.
+    """
+
+    def __init__(self, ttls=CACHE_TTLS, stale_ttl=CACHE_STALE_TTL, maxsize=CACHE_MAXSIZE, shared=None,
+                 shared_factory=None):
+        self.ttls = ttls
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self._shared = shared
+        self._shared_factory = shared_factory
+        self._outbox = {}  # écritures vers le cache partagé, groupées par tour de boucle
+        self._entries = OrderedDict()  # clé -> (valeur, horodatage)
+        self._flight = SingleFlight()
+        self._background = set()  # références des tâches de rafraîchissement
+        self.lookups = {"hit": 0, "stale": 0, "miss": 0}  # compteurs de lectures (taux de succès)
+
+    @property
+    def shared(self):
+        if self._shared_factory is not None:
+            self._shared, self._shared_factory = self._shared_factory(), None
+        return self._shared
+
+    @shared.setter
+    def shared(self, shared):
+        self._shared, self._shared_factory = shared, None
+
+    def _ttl(self, key):
+        return self.ttls.get(key[0], CACHE_TTLS["default"])
+
+    def get(self, key, allow_stale=False):
+        """Retourne la valeur en cache (ou None), sans déclencher de requête."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, fetched_at = entry
+        age = time.monotonic() - fetched_at
+        if age < self._ttl(key) or (allow_stale and age < self._ttl(key) + self.stale_ttl):
+            return value
+        return None
+
+    def peek(self, key, record=True):
+        """Retourne (valeur, fraîche), ou (None, False) si absente ou trop ancienne pour être servie.
+
+        record=False pour les vérifications internes (planification) : la
+        lecture n'est alors pas comptée dans les statistiques du cache.
+        """
+        entry = self._entries.get(key)
+        result = "miss"
+        value, fresh = None, False
+        if entry is not None:
+            age = time.monotonic() - entry[1]
+            if age < self._ttl(key):
+                result, value, fresh = "hit", entry[0], True
+            elif age < self._ttl(key) + self.stale_ttl:
+                result, value = "stale", entry[0]
+        if record:
+            self._record(key, result)
+        return value, fresh
+
+    def set(self, key, value):
+        """Enregistre une valeur dans le cache (et la publie dans le cache partagé)."""
+        self._store(key, value, time.monotonic())
+        if self.shared is not None:
+            self._share(key, value)
+
+    def _store(self, key, value, fetched_at):
+        self._entries[key] = (value, fetched_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Supprime une entrée : le prochain accès refera la requête."""
+        self._entries.pop(key, None)
+        if self.shared is not None:
+            self._run_shared(self.shared.delete, key)
+
+    def _share(self, key, value):
+        fetched_at = time.time()
+        self._outbox[key] = (value, fetched_at, fetched_at + self._ttl(key) + self.stale_ttl)
+        if len(self._outbox) == 1:
+            # Les set() d'un même tour de boucle partent en une seule écriture
+            try:
+                asyncio.get_running_loop().call_soon(self._flush_outbox)
+            except RuntimeError:
+                self._flush_outbox()
+
+    def _flush_outbox(self):
+        entries, self._outbox = self._outbox, {}
+        if entries:
+            self._run_shared(self.shared.set_many, entries)
+
+    def _run_shared(self, function, *args):
+        # Accès au cache partagé hors de la boucle asyncio ; une panne ne bloque pas le bot
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            function(*args)
+            return
+
+        async def run():
+            try:
+                await asyncio.to_thread(function, *args)
+            except Exception as e:
+                logging.error(f"Error writing to the shared market cache: {e}")
+
+        self.spawn(run())
+
+    async def load_shared(self, keys, max_age=None):
+        """Importe du cache partagé les entrées fraîches des clés absentes ou périmées localement.
+
+        Avec max_age, toutes les clés sont consultées et seules les entrées
+        récupérées depuis moins de max_age secondes (et plus récentes que la
+        copie locale) sont importées. Retourne {clé: valeur} des entrées importées.
+        """
+        if self.shared is None:
+            return {}
+        wanted = list(keys) if max_age is not None else [key for key in keys if self.get(key) is None]
+        if not wanted:
+            return {}
+        try:
+            entries = await asyncio.to_thread(self.shared.get_many, wanted)
+        except Exception as e:
+            logging.error(f"Error reading the shared market cache: {e}")
+            return {}
+        now, monotonic_now = time.time(), time.monotonic()
+        loaded = {}
+        for key, (value, fetched_at) in entries.items():
+            age = now - fetched_at
+            if age >= (self._ttl(key) if max_age is None else max_age):
+                continue
+            local = self._entries.get(key)
+            if local is not None and local[1] >= monotonic_now - age:
+                continue
+            self._store(key, value, monotonic_now - age)
+            loaded[key] = value
+        return loaded
+
+    def export(self):
+        """Retourne [(clé, valeur, horodatage mural)] des entrées, de la moins à la plus récemment utilisée."""
+        offset = time.time() - time.monotonic()
+        return [(key, value, fetched_at + offset) for key, (value, fetched_at) in self._entries.items()]
+
+    def restore(self, entries):
+        """Recharge des entrées [(clé, valeur)] comme périmées : servies aussitôt et rafraîchies en fond.
+
+        Une entrée déjà présente (plus récente) n'est pas écrasée.
+        """
+        now = time.monotonic()
+        restored = 0
+        for key, value in entries:
+            if key not in self._entries:
+                self._store(key, value, now - self._ttl(key))
+                restored += 1
+        return restored
+
+    def _record(self, key, result):
+        self.lookups[result] += 1
+        cache_lookups.inc(cache="market", kind=key[0], result=result)
+
+    def hit_rate(self):
+        """Retourne la part des lectures servies depuis le cache (fraîches ou périmées)."""
+        total = sum(self.lookups.values())
+        return (self.lookups["hit"] + self.lookups["stale"]) / total if total else 0
+
+    def clear(self):
+        """Vide entièrement le cache."""
+        self._entries.clear()
+
+    async def get_or_fetch(self, key, fetcher):
+        """Retourne la valeur en cache, ou appelle fetcher() pour la récupérer.
+
+        fetcher est une coroutine sans argument qui retourne None en cas d'échec
+        (les échecs ne sont pas mis en cache).
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            ttl = self._ttl(key)
+            if age < ttl:
+                self._entries.move_to_end(key)
+                self._record(key, "hit")
+                return value
+            if age < ttl + self.stale_ttl:
+                # Valeur périmée mais utilisable : on la sert et on rafraîchit en fond
+                self._schedule_refresh(key, fetcher)
+                self._record(key, "stale")
+                return value
+
+        self._record(key, "miss")
+        return await self._fetch(key, fetcher)
+
+    async def _fetch(self, key, fetcher):
+        async def fetch_and_store():
+            if self.shared is not None:
+                # Un autre processus a peut-être déjà récupéré cette valeur
+                await self.load_shared([key])
+                value = self.get(key)
+                if value is not None:
+                    return value
+            value = await fetcher()
+            if value is not None:
+                self.set(key, value)
+            return value
+
+        return await self._flight.do(key, fetch_and_store)
+
+    async def get_or_fetch_many(self, keys, fetcher):
+        """Version groupée de get_or_fetch : retourne {clé: valeur} pour les clés disponibles.
+
+        fetcher(clés) est une coroutine qui récupère plusieurs clés en une
+        requête et retourne {clé: valeur}. Les clés absentes sont récupérées
+        ensemble ; les périmées sont servies et rafraîchies ensemble en
+        arrière-plan. Une clé déjà en cours de récupération, seule ou dans un
+        autre lot, n'est jamais redemandée.
+        """
+        results = {}
+        missing = []
+        stale = []
+        for key in dict.fromkeys(keys):
+            value, fresh = self.peek(key)
+            if value is None:
+                missing.append(key)
+            else:
+                results[key] = value
+                if not fresh and not self._flight.in_flight(key):
+                    stale.append(key)
+
+        fetch_and_store = self._batch_fetcher(fetcher)
+        if stale:
+            self.spawn(self._await_refresh(self._flight.start_many(stale, fetch_and_store)))
+        if missing:
+            futures = self._flight.start_many(missing, fetch_and_store)
+            values = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+            results.update((key, value) for key, value in zip(futures, values) if value is not None)
+        return results
+
+    def _batch_fetcher(self, fetcher):
+        async def fetch_and_store(keys):
+            values = {}
+            if self.shared is not None:
+                # Un autre processus a peut-être déjà récupéré certaines clés
+                await self.load_shared(keys)
+                values = {key: self.get(key) for key in keys if self.get(key) is not None}
+            remaining = [key for key in keys if key not in values]
+            if remaining:
+                for key, value in (await fetcher(remaining)).items():
+                    if value is not None:
+                        self.set(key, value)
+                        values[key] = value
+            return values
+
+        return fetch_and_store
+
+    async def _await_refresh(self, futures):
+        results = await asyncio.gather(*futures.values(), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            logging.error(f"Error refreshing {len(errors)} cache entries: {errors[0]}")
+
+    def _schedule_refresh(self, key, fetcher):
+        if self._flight.in_flight(key):
+            return
+
+        async def refresh():
+            try:
+                await self._fetch(key, fetcher)
+            except Exception as e:
+                logging.error(f"Error refreshing cache entry {key}: {e}")
+
+        self.spawn(refresh())
+
+    def spawn(self, coro):
+        """Lance une tâche de rafraîchissement en arrière-plan (priorité basse) en gardant sa référence."""
+        async def run():
+            with priority(PRIORITY_BACKGROUND):
+                return await coro
+
+        task = asyncio.create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+
+# Cache unique partagé par tout le bot (et entre processus si CACHE_BACKEND le permet)
+market_cache = MarketCache(shared_factory=create_shared_cache)
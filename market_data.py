@@ -0,0 +1,364 @@
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+import httpx
+import constants
+from constants import (
+    BIRDEYE_BATCH_SIZE, RPC_BATCH_SIZE, DEX_BATCH_SIZE,
+    HTTP_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_MAX_RETRIES, HTTP_RETRY_BASE_DELAY,
+    MAX_CONCURRENT_LOOKUPS, PRICE_REFRESH_MIN_INTERVAL,
+)
+from market_cache import SingleFlight, market_cache
+from metrics import upstream_errors, upstream_retries, upstream_seconds
+from price_feed import price_feed
+from rate_limiter import limiters
+from token_metadata import token_metadata
+
+
+# Client HTTP partagé (connexions keep-alive réutilisées entre les handlers)
+_client = None
+
+# Regroupe les récupérations concurrentes de métadonnées d'un même token
+_metadata_flight = SingleFlight()
+
+
+def get_client():
+    """Retourne le client HTTP asynchrone partagé, en le créant si besoin."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        )
+    return _client
+
+async def close_client():
+    """Ferme le client HTTP partagé."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def retry_after_delay(response):
+    """Retourne le délai demandé par l'en-tête Retry-After, en secondes, ou None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            return None
+
+async def fetch_json(method, url, upstream, **kwargs):
+    """Effectue une requête HTTP limitée par le budget de l'API et retourne le JSON.
+
+    Les 429 et 503 sont retentés avec un backoff exponentiel à jitter, en
+    respectant l'en-tête Retry-After quand il est présent.
+    """
+    client = get_client()
+    limiter = limiters[upstream]
+    for attempt in range(HTTP_MAX_RETRIES):
+        await limiter.acquire()
+        try:
+            with upstream_seconds.time(upstream=upstream):
+                response = await client.request(method, url, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in (429, 503):
+                upstream_retries.inc(upstream=upstream, status=e.response.status_code)
+                retry_after = retry_after_delay(e.response)
+                if retry_after is not None:
+                    # Toutes les requêtes vers cette API attendent, pas seulement celle-ci
+                    limiter.pause(retry_after)
+                    delay = retry_after + random.uniform(0, HTTP_RETRY_BASE_DELAY)
+                else:
+                    delay = random.uniform(0, HTTP_RETRY_BASE_DELAY * 2 ** (attempt + 1))
+                logging.warning(f"Too Many Requests from {upstream}. Retrying in {delay:.2f} seconds...")
+                await asyncio.sleep(delay)
+            else:
+                logging.error(f"Error fetching data from {upstream}: {e}")
+                upstream_errors.inc(upstream=upstream)
+                return None
+        except (httpx.HTTPError, httpx.InvalidURL, TypeError, ValueError) as e:
+            # TypeError / InvalidURL : requête mal formée (en-tête ou URL invalide), inutile de réessayer
+            logging.error(f"Error fetching data from {upstream}: {e}")
+            upstream_errors.inc(upstream=upstream)
+            return None
+    logging.error(f"Failed to fetch data from {upstream} after retries: {url}")
+    upstream_errors.inc(upstream=upstream)
+    return None
+
+async def fetch_sol_price():
+    """Retourne le prix du SOL en USD depuis Binance."""
+    price_data = await fetch_json("GET", constants.BINANCE_API_URL, "binance")
+    if not price_data:
+        return None
+    return float(price_data.get("price", 0)) or None
+
+async def refresh_sol_price():
+    """Récupère le prix du SOL et le pousse dans le cache de marché."""
+    sol_price = await fetch_sol_price()
+    if sol_price is not None:
+        market_cache.set(("sol_price",), sol_price)
+    return sol_price
+
+async def get_sol_price():
+    """Retourne le prix du SOL en USD, via le cache de marché."""
+    return await market_cache.get_or_fetch(("sol_price",), fetch_sol_price)
+
+def birdeye_headers():
+    """En-têtes des requêtes Birdeye ; sans clé configurée, l'en-tête X-API-KEY est omis."""
+    headers = {"accept": "application/json", "x-chain": "solana"}
+    if constants.BIRDEYE_API_KEY:
+        headers["X-API-KEY"] = constants.BIRDEYE_API_KEY
+    return headers
+
+async def fetch_token_price(contract_address):
+    """Retourne le prix USD d'un token depuis Birdeye."""
+    price_data = await fetch_json("GET", f"{constants.BIRDEYE_API_URL}{contract_address}", "birdeye", headers=birdeye_headers())
+    if price_data is None:
+        return None
+    token_price = price_data.get("data", {}).get("value")
+    if token_price is None:
+        logging.error(f"Birdeye API did not return a valid price for {contract_address}")
+    return token_price
+
+async def fetch_token_supply(contract_address):
+    """Retourne (supply totale, décimales) d'un token depuis le RPC Solana."""
+    payload = {"jsonrpc": "2.0", "id": 1, "method": "getTokenSupply", "params": [contract_address]}
+    data = await fetch_json("POST", constants.RPC_URL, "rpc", json=payload)
+    if data is None:
+        return None, None
+    if "result" in data and "value" in data["result"]:
+        value = data["result"]["value"]
+        decimals = int(value.get("decimals", 6))
+        return int(value["amount"]) / 10**decimals, decimals
+    logging.error(f"No supply data found in RPC response for {contract_address}")
+    return None, None
+
+async def fetch_token_name(contract_address):
+    """Retourne le nom d'un token depuis DexScreener."""
+    data = await fetch_json("GET", f"{constants.DEX_API_URL}{contract_address}", "dexscreener")
+    if not data or not isinstance(data, list):
+        logging.error(f"No data found in DexScreener response for {contract_address}")
+        return None
+    return data[0]["baseToken"]["name"]
+
+async def get_token_metadata(contract_address):
+    """Retourne les métadonnées (nom, supply, décimales) d'un token, depuis le disque si possible."""
+    metadata = token_metadata.get(contract_address)
+    if metadata is not None or token_metadata.is_missing(contract_address):
+        return metadata
+
+    async def fetch():
+        (total_supply, decimals), token_name = await asyncio.gather(
+            fetch_token_supply(contract_address),
+            fetch_token_name(contract_address),
+        )
+        if total_supply is None or token_name is None:
+            token_metadata.mark_missing([contract_address])
+            return None
+        return token_metadata.set(contract_address, token_name, total_supply, decimals)
+
+    return await _metadata_flight.do(contract_address, fetch)
+
+async def fetch_and_publish_token_price(contract_address):
+    """Récupère le prix d'un token et le diffuse sur le flux de prix."""
+    token_price = await fetch_token_price(contract_address)
+    if token_price is not None:
+        price_feed.publish(contract_address, token_price)
+    return token_price
+
+async def get_token_price(contract_address):
+    """Retourne le prix USD d'un token, via le cache de marché."""
+    return await market_cache.get_or_fetch(("price", contract_address), lambda: fetch_and_publish_token_price(contract_address))
+
+async def get_token_information(contract_address):
+    """Retourne (prix, market cap, nom) d'un token.
+
+    Seul le prix est récupéré à chaque expiration du cache ; le nom et la
+    supply viennent du stockage de métadonnées.
+    """
+    price_feed.viewed(contract_address)
+    token_price, metadata = await asyncio.gather(
+        get_token_price(contract_address),
+        get_token_metadata(contract_address),
+    )
+    if token_price is None or metadata is None:
+        return None, None, None
+
+    real_market_cap = float(token_price) * metadata["supply"] if token_price and metadata["supply"] else None
+    return token_price, real_market_cap, metadata["name"]
+
+def invalidate_token_information(contract_address):
+    """Force la prochaine lecture du prix d'un token à interroger Birdeye."""
+    market_cache.invalidate(("price", contract_address))
+
+def invalidate_sol_price():
+    """Force la prochaine lecture du prix du SOL à interroger Binance."""
+    market_cache.invalidate(("sol_price",))
+
+def chunked(items, size):
+    """Découpe une liste en morceaux de taille maximale size."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+async def gather_chunks(fetch_chunk, items, size):
+    """Appelle fetch_chunk sur chaque morceau en parallèle (borné) et fusionne les dictionnaires retournés."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_LOOKUPS)
+
+    async def bounded(chunk):
+        async with semaphore:
+            return await fetch_chunk(chunk)
+
+    merged = {}
+    for result in await asyncio.gather(*(bounded(chunk) for chunk in chunked(items, size))):
+        merged.update(result)
+    return merged
+
+async def fetch_token_prices(contract_addresses):
+    """Retourne {adresse: prix USD} via l'endpoint multi-prix de Birdeye."""
+    headers = birdeye_headers()
+
+    async def fetch_chunk(chunk):
+        data = await fetch_json("GET", f"{constants.BIRDEYE_MULTI_PRICE_URL}{','.join(chunk)}", "birdeye", headers=headers)
+        prices = {}
+        for ca, item in ((data or {}).get("data") or {}).items():
+            if item and item.get("value") is not None:
+                prices[ca] = item["value"]
+        return prices
+
+    return await gather_chunks(fetch_chunk, list(contract_addresses), BIRDEYE_BATCH_SIZE)
+
+async def fetch_token_supplies(contract_addresses):
+    """Retourne {adresse: (supply totale, décimales)} via des requêtes JSON-RPC groupées."""
+
+    async def fetch_chunk(chunk):
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": "getTokenSupply", "params": [ca]}
+            for i, ca in enumerate(chunk)
+        ]
+        data = await fetch_json("POST", constants.RPC_URL, "rpc", json=payload)
+        supplies = {}
+        for item in data if isinstance(data, list) else []:
+            value = (item.get("result") or {}).get("value")
+            if value is None or not isinstance(item.get("id"), int) or item["id"] >= len(chunk):
+                continue
+            decimals = int(value.get("decimals", 6))
+            supplies[chunk[item["id"]]] = (int(value["amount"]) / 10**decimals, decimals)
+        return supplies
+
+    return await gather_chunks(fetch_chunk, list(contract_addresses), RPC_BATCH_SIZE)
+
+async def fetch_token_names(contract_addresses):
+    """Retourne {adresse: nom} via la liste d'adresses séparées par des virgules de DexScreener."""
+
+    async def fetch_chunk(chunk):
+        data = await fetch_json("GET", f"{constants.DEX_API_URL}{','.join(chunk)}", "dexscreener")
+        names = {}
+        for pair in data if isinstance(data, list) else []:
+            base_token = pair.get("baseToken") or {}
+            if base_token.get("address") in chunk:
+                names.setdefault(base_token["address"], base_token.get("name"))
+        return names
+
+    return await gather_chunks(fetch_chunk, list(contract_addresses), DEX_BATCH_SIZE)
+
+async def fetch_tokens_metadata(contract_addresses):
+    """Récupère en requêtes groupées les métadonnées de plusieurs tokens et les enregistre.
+
+    Les tokens sans nom ou sans supply sont notés comme introuvables pour
+    ne pas être redemandés à chaque affichage.
+    """
+    supplies, names = await asyncio.gather(fetch_token_supplies(contract_addresses), fetch_token_names(contract_addresses))
+    entries = {
+        ca: (names[ca], supplies[ca][0], supplies[ca][1])
+        for ca in contract_addresses if ca in supplies and names.get(ca)
+    }
+    token_metadata.mark_missing([ca for ca in contract_addresses if ca not in entries])
+    return token_metadata.set_many(entries)
+
+async def get_tokens_metadata(contract_addresses):
+    """Retourne {adresse: métadonnées}, en récupérant les manquantes par requêtes groupées.
+
+    Une adresse déjà en cours de récupération n'est pas redemandée.
+    """
+    result = {}
+    missing = []
+    for ca in contract_addresses:
+        metadata = token_metadata.get(ca)
+        if metadata is not None:
+            result[ca] = metadata
+        elif not token_metadata.is_missing(ca):
+            missing.append(ca)
+    if missing:
+        futures = _metadata_flight.start_many(missing, fetch_tokens_metadata)
+        values = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        result.update((ca, metadata) for ca, metadata in zip(futures, values) if metadata is not None)
+    return result
+
+async def refresh_token_prices(contract_addresses):
+    """Récupère les prix de plusieurs tokens en une requête groupée et les pousse dans le cache.
+
+    Avec un cache partagé, un prix qu'un autre processus vient de récupérer
+    (depuis moins de PRICE_REFRESH_MIN_INTERVAL secondes) est repris tel quel
+    au lieu d'être redemandé.
+    """
+    keys = [("price", ca) for ca in contract_addresses]
+    loaded = await market_cache.load_shared(keys, max_age=PRICE_REFRESH_MIN_INTERVAL)
+    prices = {ca: price for (_, ca), price in loaded.items()}
+    missing = [ca for ca in contract_addresses if ca not in prices]
+    if missing:
+        fetched = await fetch_token_prices(missing)
+        for ca, price in fetched.items():
+            market_cache.set(("price", ca), price)
+        prices.update(fetched)
+    for ca, price in prices.items():
+        price_feed.publish(ca, price)
+    return prices
+
+async def fetch_price_entries(keys):
+    """Récupère en une requête groupée les prix des clés ("price", adresse) et les diffuse."""
+    prices = await fetch_token_prices([ca for _, ca in keys])
+    for ca, price in prices.items():
+        price_feed.publish(ca, price)
+    return {("price", ca): price for ca, price in prices.items()}
+
+async def get_tokens_prices(contract_addresses):
+    """Retourne {adresse: prix} : cache d'abord, puis une requête groupée pour les prix manquants.
+
+    Les prix périmés mais encore utilisables sont servis tels quels et
+    rafraîchis ensemble en arrière-plan. Un prix déjà en cours de
+    récupération (par un autre handler ou un autre lot) n'est pas redemandé.
+    """
+    keys = [("price", ca) for ca in contract_addresses]
+    # Les prix déjà récupérés par un autre processus évitent une requête
+    await market_cache.load_shared(keys)
+    prices = await market_cache.get_or_fetch_many(keys, fetch_price_entries)
+    return {ca: price for (_, ca), price in prices.items()}
+
+async def get_tokens_information(contract_addresses):
+    """Retourne {adresse: (prix, market cap, nom)} pour tout un portefeuille en quelques requêtes groupées."""
+    addresses = list(dict.fromkeys(contract_addresses))
+    if not addresses:
+        return {}
+    for ca in addresses:
+        price_feed.viewed(ca)
+    prices, metadata = await asyncio.gather(get_tokens_prices(addresses), get_tokens_metadata(addresses))
+
+    results = {}
+    for ca in addresses:
+        token_price = prices.get(ca)
+        token_metadata_entry = metadata.get(ca)
+        if token_price is None or token_metadata_entry is None:
+            results[ca] = (None, None, None)
+            continue
+        supply = token_metadata_entry["supply"]
+        real_market_cap = float(token_price) * supply if token_price and supply else None
+        results[ca] = (token_price, real_market_cap, token_metadata_entry["name"])
+    return results
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import constants
+from constants import MARKET_SNAPSHOT_MAX_AGE
+from market_cache import market_cache
+
+SNAPSHOT_VERSION = 1
+
+
+class MarketSnapshot:
+    """Instantané du cache de marché sur disque, pour ne pas redémarrer à froid.
+
+    Format JSON Lines : une ligne d'en-tête ({"version", "saved_at"}) puis une
+    ligne par entrée ({"key", "value", "fetched_at"}, horodatage mural), de la
+    moins à la plus récemment utilisée. Au chargement, les entrées plus
+    anciennes que max_age sont ignorées et les autres sont servies comme
+    périmées jusqu'à leur premier rafraîchissement.
+    """
+
+    def __init__(self, path=None, cache=market_cache, max_age=MARKET_SNAPSHOT_MAX_AGE):
+        self._path = path
+        self.cache = cache
+        self.max_age = max_age
+
+    @property
+    def path(self):
+        if self._path is None:
+            path = constants.MARKET_SNAPSHOT_FILE
+            if constants.SHARD_INDEX >= 0:
+                # Un fichier par worker : les caches locaux des workers sont distincts
+                root, extension = os.path.splitext(path)
+                path = f"{root}_{constants.SHARD_INDEX}{extension}"
+            self._path = path
+        return self._path
+
+    def _write(self, entries):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # Écriture atomique : un arrêt brutal ne laisse pas de fichier tronqué
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(json.dumps({"version": SNAPSHOT_VERSION, "saved_at": time.time()}) + "\n")
+            for key, value, fetched_at in entries:
+                file.write(json.dumps({"key": list(key), "value": value, "fetched_at": fetched_at}) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _read(self):
+        """Retourne [(clé, valeur)] des entrées assez récentes du fichier."""
+        if not os.path.exists(self.path):
+            return []
+        oldest = time.time() - self.max_age
+        entries = []
+        with open(self.path, "r") as file:
+            header = json.loads(file.readline() or "{}")
+            if header.get("version") != SNAPSHOT_VERSION:
+                logging.warning(f"Ignoring market snapshot {self.path} with unknown version {header.get('version')}")
+                return []
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # ligne tronquée : on garde ce qui précède
+                if entry["fetched_at"] >= oldest:
+                    entries.append((tuple(entry["key"]), entry["value"]))
+        return entries
+
+    def save(self):
+        """Écrit l'instantané du cache (appel bloquant)."""
+        entries = self.cache.export()
+        self._write(entries)
+        return len(entries)
+
+    async def save_async(self):
+        """Écrit l'instantané du cache dans un thread ; les entrées sont copiées sur la boucle."""
+        entries = self.cache.export()
+        try:
+            await asyncio.to_thread(self._write, entries)
+        except OSError as e:
+            logging.error(f"Error saving market snapshot to {self.path}: {e}")
+        return len(entries)
+
+    async def load_async(self):
+        """Recharge l'instantané dans le cache ; retourne le nombre d'entrées restaurées."""
+        try:
+            entries = await asyncio.to_thread(self._read)
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Error loading market snapshot from {self.path}: {e}")
+            return 0
+        return self.cache.restore(entries)
+
+
+market_snapshot = MarketSnapshot()
@@ -0,0 +1,277 @@
+import asyncio
+import functools
+import logging
+import math
+import time
+from collections import defaultdict
+
+
+# Bornes des histogrammes de durée, en secondes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Compteur croissant, par combinaison d'étiquettes."""
+
+    kind = "counter"
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        self._values[_label_key(labels)] += amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def by_labels(self):
+        """Retourne [(étiquettes, valeur)] pour chaque combinaison d'étiquettes."""
+        return [(dict(key), value) for key, value in list(self._values.items())]
+
+    def samples(self):
+        for key, value in list(self._values.items()):
+            yield self.name, key, value
+
+
+class Gauge:
+    """Valeur instantanée, fixée à la main ou lue par une fonction au moment de l'export."""
+
+    kind = "gauge"
+
+    def __init__(self, name, description, function=None):
+        self.name = name
+        self.description = description
+        self.function = function
+        self._values = defaultdict(float)
+
+    def set(self, value, **labels):
+        self._values[_label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        self._values[_label_key(labels)] += amount
+
+    def dec(self, amount=1, **labels):
+        self._values[_label_key(labels)] -= amount
+
+    def value(self, **labels):
+        if self.function is not None:
+            return self.function()
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        if self.function is not None:
+            yield self.name, (), self.function()
+            return
+        for key, value in list(self._values.items()):
+            yield self.name, key, value
+
+
+class Histogram:
+    """Distribution de durées par seaux cumulatifs, par combinaison d'étiquettes."""
+
+    kind = "histogram"
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._series = {}  # étiquettes -> [compte par seau, somme, total]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def time(self, **labels):
+        """Context manager qui mesure la durée du bloc."""
+        return _Timer(self, labels)
+
+    def label_sets(self):
+        return [dict(key) for key in self._series]
+
+    def count(self, **labels):
+        series = self._series.get(_label_key(labels))
+        return series[2] if series else 0
+
+    def mean(self, **labels):
+        series = self._series.get(_label_key(labels))
+        return series[1] / series[2] if series and series[2] else 0
+
+    def quantile(self, fraction, **labels):
+        """Retourne la borne supérieure du seau contenant le quantile demandé."""
+        series = self._series.get(_label_key(labels))
+        if not series or not series[2]:
+            return 0
+        target = fraction * series[2]
+        cumulative = 0
+        for bound, count in zip(self.buckets, series[0]):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return math.inf
+
+    def samples(self):
+        for key, (counts, total, count) in list(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else repr(bound)
+                yield f"{self.name}_bucket", key + (("le", le),), cumulative
+            yield f"{self.name}_sum", key, total
+            yield f"{self.name}_count", key, count
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+_registry = {}
+
+
+def _register(metric):
+    return _registry.setdefault(metric.name, metric)
+
+
+def counter(name, description):
+    return _register(Counter(name, description))
+
+
+def gauge(name, description, function=None):
+    return _register(Gauge(name, description, function))
+
+
+def histogram(name, description, buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, description, buckets))
+
+
+def render():
+    """Exporte toutes les métriques au format texte de Prometheus."""
+    lines = []
+    for metric in list(_registry.values()):
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, key, value in metric.samples():
+            lines.append(f"{name}{_format_labels(key)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+# Métriques des chemins chauds
+upstream_seconds = histogram("upstream_request_seconds", "Durée des requêtes HTTP vers les APIs de marché")
+upstream_retries = counter("upstream_retries_total", "Requêtes retentées après un 429 ou un 503")
+upstream_errors = counter("upstream_errors_total", "Requêtes abandonnées en erreur")
+handler_seconds = histogram("handler_seconds", "Durée des handlers Telegram")
+telegram_seconds = histogram("telegram_request_seconds", "Durée des appels à l'API Bot de Telegram")
+cache_lookups = counter("cache_lookups_total", "Lectures de cache par résultat (hit, stale, miss)")
+wallet_io_seconds = histogram("wallet_io_seconds", "Durée des lectures et écritures du stockage de portefeuilles")
+active_handlers = gauge("active_handlers", "Handlers Telegram en cours d'exécution")
+active_users = gauge("active_users", "Utilisateurs ayant une mise à jour en cours ou en attente")
+
+
+def instrument_handler(callback):
+    """Décorateur : mesure la durée d'un handler Telegram et compte les handlers actifs."""
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        active_handlers.inc()
+        try:
+            with handler_seconds.time(handler=callback.__name__):
+                return await callback(*args, **kwargs)
+        finally:
+            active_handlers.dec()
+    return wrapper
+
+
+def _format_seconds(seconds):
+    return "∞" if seconds == math.inf else f"{seconds * 1000:.0f} ms"
+
+
+def _timing_lines(metric, label):
+    lines = []
+    for labels in sorted(metric.label_sets(), key=lambda labels: labels.get(label, "")):
+        lines.append(
+            f"   {labels.get(label)}: {metric.count(**labels)} calls, {_format_seconds(metric.mean(**labels))} avg, "
+            f"p99 ≤ {_format_seconds(metric.quantile(0.99, **labels))}"
+        )
+    return lines or ["   (no data)"]
+
+
+def perf_report():
+    """Retourne le résumé des métriques affiché par la commande /perf."""
+    lines = ["⚙️ Performance ⚙️", "", "Upstreams:"]
+    for line in _timing_lines(upstream_seconds, "upstream"):
+        lines.append(line)
+    retries = defaultdict(float)
+    for labels, value in upstream_retries.by_labels():
+        retries[labels["upstream"]] += value
+    for upstream, count in sorted(retries.items()):
+        lines.append(f"   {upstream}: {count:g} retries (429/503), {upstream_errors.value(upstream=upstream):g} errors")
+    lines += ["", "Handlers:", *_timing_lines(handler_seconds, "handler")]
+    lines += ["", "Telegram API:", *_timing_lines(telegram_seconds, "method")]
+    lines += ["", "Wallet I/O:", *_timing_lines(wallet_io_seconds, "operation")]
+    lines += ["", "Caches:"]
+    results = defaultdict(lambda: defaultdict(float))
+    for labels, value in cache_lookups.by_labels():
+        results[labels["cache"]][labels["result"]] += value
+    for cache, counts in sorted(results.items()):
+        total = sum(counts.values())
+        served = counts["hit"] + counts["stale"]
+        lines.append(f"   {cache}: {served / total * 100:.1f}% hits ({counts['stale']:g} stale, {counts['miss']:g} misses)")
+    lines += ["", f"Active: {active_handlers.value():g} handlers, {active_users.value():g} users"]
+    return "\n".join(lines)
+
+
+async def _serve_request(reader, writer):
+    try:
+        request_line = await reader.readline()
+        # Ignore les en-têtes de la requête
+        while (await reader.readline()).strip():
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/metrics"):
+            status, body = "200 OK", render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        logging.warning(f"Metrics request failed: {e}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host, port):
+    """Sert /metrics au format Prometheus sur host:port, dans la boucle asyncio du bot."""
+    server = await asyncio.start_server(_serve_request, host, port)
+    logging.info(f"Metrics available on http://{host}:{server.sockets[0].getsockname()[1]}/metrics")
+    return server
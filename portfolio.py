@@ -0,0 +1,176 @@
+import time
+
+
+def position_pnl(data, market_cap):
+    """Retourne (PNL en %, PNL en SOL) d'une position selon la market cap actuelle."""
+    pnl = (market_cap - data["purchase_market_cap"]) / data["purchase_market_cap"] * 100 if data["purchase_market_cap"] else 0
+    profit_loss = (pnl * data["sol_spent"]) / 100 if data["sol_spent"] else 0
+    return pnl, profit_loss
+
+
+def get_stats(wallet):
+    """Retourne les agrégats du portefeuille, initialisés depuis les positions s'ils n'existent pas."""
+    stats = wallet.get("stats")
+    if stats is None:
+        tokens = {
+            ca: {"cost_basis": data.get("sol_spent", 0) - data.get("sol_sold", 0), "realized_pnl": 0}
+            for ca, data in wallet.get("tokens", {}).items()
+        }
+        cost_basis = sum(token["cost_basis"] for token in tokens.values())
+        stats = {
+            "buys": 0,
+            "sells": 0,
+            "wins": 0,
+            "losses": 0,
+            "volume_sol": 0,
+            "realized_pnl": wallet.get("general_pnl", 0),
+            "cost_basis": cost_basis,
+            "deposits": 0,
+            # Rendement pondéré dans le temps : indice chaîné à chaque dépôt
+            "twr_index": 1.0,
+            "twr_base": wallet.get("sol_balance", 0) + cost_basis,
+            "tokens": tokens,
+            "updated_at": time.time(),
+        }
+        wallet["stats"] = stats
+    return stats
+
+
+def record_deposit(wallet, amount):
+    """Met à jour les agrégats après un dépôt de SOL (clôture d'une sous-période du TWR)."""
+    stats = get_stats(wallet)
+    value_before = wallet["sol_balance"] + stats["cost_basis"]
+    if stats["twr_base"] > 0:
+        stats["twr_index"] *= value_before / stats["twr_base"]
+    stats["twr_base"] = value_before + amount
+    stats["deposits"] += amount
+    stats["updated_at"] = time.time()
+
+
+def record_buy(wallet, contract_address, amount_sol):
+    """Met à jour les agrégats après un achat."""
+    stats = get_stats(wallet)
+    token = stats["tokens"].setdefault(contract_address, {"cost_basis": 0, "realized_pnl": 0})
+    token["cost_basis"] += amount_sol
+    stats["cost_basis"] += amount_sol
+    stats["buys"] += 1
+    stats["volume_sol"] += amount_sol
+    stats["updated_at"] = time.time()
+
+
+def record_sell(wallet, contract_address, proportion_sold, amount_sol):
+    """Met à jour les agrégats après une vente d'une fraction proportion_sold de la position."""
+    stats = get_stats(wallet)
+    token = stats["tokens"].setdefault(contract_address, {"cost_basis": 0, "realized_pnl": 0})
+    cost_of_sold = token["cost_basis"] * proportion_sold
+    realized = amount_sol - cost_of_sold
+    token["cost_basis"] -= cost_of_sold
+    token["realized_pnl"] += realized
+    stats["cost_basis"] -= cost_of_sold
+    stats["realized_pnl"] += realized
+    stats["sells"] += 1
+    stats["wins" if realized >= 0 else "losses"] += 1
+    stats["volume_sol"] += amount_sol
+    stats["updated_at"] = time.time()
+
+
+def apply_buy(wallet, contract_address, amount_sol, sol_price, token_price, market_cap, token_name, timestamp=None):
+    """Applique un achat déjà validé au portefeuille et retourne (nombre de tokens, transaction).
+
+    Pure comptabilité, sans appel réseau ni écriture : partagée par buy_token et les replays.
+    """
+    num_tokens = (sol_price / token_price) * amount_sol
+
+    wallet["sol_balance"] -= amount_sol
+    tokens = wallet["tokens"]
+    if contract_address not in tokens:
+        tokens[contract_address] = {"name": token_name, "quantity": 0, "purchase_market_cap": market_cap, "purchase_price": token_price, "sol_spent": 0, "sol_sold": 0}
+    position = tokens[contract_address]
+
+    if position["quantity"] == 0:
+        position["purchase_market_cap"] = market_cap
+
+    average_market_cap = (position["purchase_market_cap"] * position["quantity"] + market_cap * num_tokens) / (position["quantity"] + num_tokens)
+
+    position["quantity"] += round(num_tokens, 2)
+    position["purchase_market_cap"] = average_market_cap
+    position["sol_spent"] += amount_sol
+    record_buy(wallet, contract_address, amount_sol)
+
+    transaction = {
+        "type": "buy",
+        "token": token_name,
+        "contract_address": contract_address,
+        "quantity": round(num_tokens, 2),
+        "sol_amount": amount_sol,
+        "price_usd": token_price,
+        "timestamp": _format_timestamp(timestamp),
+    }
+    return num_tokens, transaction
+
+
+def apply_sell(wallet, contract_address, amount_tokens, sol_price, token_price, token_name, timestamp=None):
+    """Applique une vente déjà validée au portefeuille et retourne (SOL reçus, PNL de la vente, transaction).
+
+    La position est supprimée si la quantité restante passe sous 0,01.
+    """
+    position = wallet["tokens"][contract_address]
+    amount_sol = (token_price / sol_price) * amount_tokens
+
+    # Calcul du PNL pour cette vente
+    proportion_sold = amount_tokens / position["quantity"]
+    trade_pnl = amount_sol - position["sol_spent"] * proportion_sold
+
+    wallet["general_pnl"] = wallet.get("general_pnl", 0) + trade_pnl
+    wallet["sol_balance"] += amount_sol
+    record_sell(wallet, contract_address, proportion_sold, amount_sol)
+
+    if position["quantity"] - amount_tokens < 0.01:
+        del wallet["tokens"][contract_address]
+    else:
+        position["quantity"] -= amount_tokens
+        position["sol_sold"] += amount_sol
+        if position["quantity"] < 0.01:
+            del wallet["tokens"][contract_address]
+
+    transaction = {
+        "type": "sell",
+        "token": token_name,
+        "contract_address": contract_address,
+        "quantity": amount_tokens,
+        "sol_amount": amount_sol,
+        "price_usd": token_price,
+        "pnl": trade_pnl,
+        "timestamp": _format_timestamp(timestamp),
+    }
+    return amount_sol, trade_pnl, transaction
+
+
+def prune_positions(wallet):
+    """Supprime les positions dont la quantité est inférieure à 1."""
+    dust = [address for address, info in wallet["tokens"].items() if info["quantity"] < 1]
+    for address in dust:
+        del wallet["tokens"][address]
+
+
+def _format_timestamp(timestamp):
+    # Horodatage de l'historique ; les replays fournissent l'instant du tick rejoué
+    if timestamp is None:
+        return time.strftime("%Y-%m-%d %H:%M:%S")
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+
+def time_weighted_return(wallet):
+    """Retourne le rendement pondéré dans le temps (valeur au coût des positions), en %."""
+    stats = get_stats(wallet)
+    if stats["twr_base"] <= 0:
+        return 0
+    current_value = wallet["sol_balance"] + stats["cost_basis"]
+    return (stats["twr_index"] * current_value / stats["twr_base"] - 1) * 100
+
+
+def win_rate(wallet):
+    """Retourne le pourcentage de ventes gagnantes."""
+    stats = get_stats(wallet)
+    closed = stats["wins"] + stats["losses"]
+    return stats["wins"] / closed * 100 if closed else 0
@@ -0,0 +1,40 @@
+import logging
+
+
+class PriceFeed:
+    """Diffuse chaque nouveau prix de token récupéré auprès des APIs à ses abonnés.
+
+    Tous les consommateurs (ordres limites, rafraîchissements, affichage)
+    partagent ainsi un seul tick de prix par token.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._view_subscribers = []
+
+    def subscribe(self, callback):
+        """Enregistre callback(contract_address, price), appelé à chaque nouveau prix."""
+        self._subscribers.append(callback)
+
+    def publish(self, contract_address, price):
+        """Transmet un nouveau prix à tous les abonnés."""
+        for callback in self._subscribers:
+            try:
+                callback(contract_address, price)
+            except Exception as e:
+                logging.error(f"Error in price feed subscriber for {contract_address}: {e}")
+
+    def subscribe_views(self, callback):
+        """Enregistre callback(contract_address), appelé quand un utilisateur consulte un token."""
+        self._view_subscribers.append(callback)
+
+    def viewed(self, contract_address):
+        """Signale qu'un utilisateur vient de consulter un token."""
+        for callback in self._view_subscribers:
+            try:
+                callback(contract_address)
+            except Exception as e:
+                logging.error(f"Error in price feed view subscriber for {contract_address}: {e}")
+
+
+price_feed = PriceFeed()
@@ -0,0 +1,202 @@
+import asyncio
+import mmap
+import os
+import time
+from array import array
+from collections import defaultdict
+import constants
+from price_feed import price_feed
+from token_metadata import token_metadata
+
+
+# Ticks bruts : (horodatage, prix, market cap) en float64
+RAW_WIDTH = 3
+# Agrégats : (début du créneau, ouverture, plus haut, plus bas, clôture, market cap de clôture)
+ROLLUP_WIDTH = 6
+RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+
+class PriceHistoryStore:
+    """Historique local des prix, en colonnes float64 de largeur fixe.
+
+    Chaque token a un fichier de ticks bruts et un fichier par résolution
+    (1m, 1h, 1d). Les ticks sont d'abord accumulés dans des array("d") en
+    mémoire puis ajoutés aux fichiers par flush() ; les lectures passent par
+    mmap et une recherche dichotomique sur les horodatages.
+    """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._pending = defaultdict(lambda: defaultdict(lambda: array("d")))  # adresse -> fichier -> valeurs
+        self._open = {}  # (adresse, résolution) -> créneau en cours
+        self._restored = set()  # tokens dont les créneaux en cours ont été relus du disque
+
+    @property
+    def directory(self):
+        # Lu dans la configuration au premier accès, pas à l'import
+        return self._directory or constants.PRICE_HISTORY_DIR
+
+    def _path(self, contract_address, name):
+        return os.path.join(self.directory, contract_address, f"{name}.bin")
+
+    def record(self, contract_address, price, market_cap, timestamp=None):
+        """Enregistre un tick de prix et met à jour les agrégats."""
+        timestamp = time.time() if timestamp is None else timestamp
+        price = float(price)
+        market_cap = float(market_cap or 0)
+        if contract_address not in self._restored:
+            self._restore_open(contract_address)
+        files = self._pending[contract_address]
+        files["raw"].extend((timestamp, price, market_cap))
+        for name, seconds in RESOLUTIONS.items():
+            start = timestamp - timestamp % seconds
+            bucket = self._open.get((contract_address, name))
+            if bucket is not None and bucket[0] == start:
+                bucket[2] = max(bucket[2], price)
+                bucket[3] = min(bucket[3], price)
+                bucket[4] = price
+                bucket[5] = market_cap
+                continue
+            if bucket is not None:
+                # Le créneau précédent est terminé : il part vers le disque
+                files[name].extend(bucket)
+            self._open[(contract_address, name)] = [start, price, price, price, price, market_cap]
+
+    def _restore_open(self, contract_address):
+        """Reconstruit les créneaux en cours depuis la fin des ticks bruts sur disque.
+
+        Les créneaux ne sont écrits qu'une fois terminés : après un
+        redémarrage, ceux en cours sont recalculés à partir des ticks bruts
+        (au plus une journée) au premier accès au token.
+        """
+        self._restored.add(contract_address)
+        last = self.price_at(contract_address, float("inf"))
+        if last is None:
+            return
+        longest = max(RESOLUTIONS.values())
+        rows = self._rows_on_disk(contract_address, "raw", RAW_WIDTH, last[0] - last[0] % longest, float("inf"))
+        for name, seconds in RESOLUTIONS.items():
+            start = last[0] - last[0] % seconds
+            bucket = None
+            for timestamp, price, market_cap in rows:
+                if timestamp < start:
+                    continue
+                if bucket is None:
+                    bucket = [start, price, price, price, price, market_cap]
+                else:
+                    bucket[2] = max(bucket[2], price)
+                    bucket[3] = min(bucket[3], price)
+                    bucket[4] = price
+                    bucket[5] = market_cap
+            if bucket is not None:
+                self._open.setdefault((contract_address, name), bucket)
+
+    def on_price(self, contract_address, price):
+        """Abonné du flux de prix : enregistre chaque tick avec sa market cap."""
+        metadata = token_metadata.get(contract_address, record=False)
+        market_cap = float(price) * metadata["supply"] if metadata else 0
+        self.record(contract_address, price, market_cap)
+
+    def flush(self):
+        """Ajoute les ticks en attente aux fichiers (les anciennes données ne sont jamais réécrites)."""
+        pending, self._pending = self._pending, defaultdict(lambda: defaultdict(lambda: array("d")))
+        self._write(pending)
+
+    async def flush_async(self):
+        """Comme flush(), avec l'écriture disque dans un thread."""
+        pending, self._pending = self._pending, defaultdict(lambda: defaultdict(lambda: array("d")))
+        await asyncio.to_thread(self._write, pending)
+
+    def _write(self, pending):
+        for contract_address, files in pending.items():
+            os.makedirs(os.path.join(self.directory, contract_address), exist_ok=True)
+            for name, values in files.items():
+                if values:
+                    with open(self._path(contract_address, name), "ab") as file:
+                        values.tofile(file)
+
+    def _rows_on_disk(self, contract_address, name, width, start, end):
+        path = self._path(contract_address, name)
+        if not os.path.exists(path) or os.path.getsize(path) < width * 8:
+            return []
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped).cast("d")
+            try:
+                count = len(view) // width
+                first = _bisect_rows(view, width, count, start)
+                rows = []
+                for index in range(first, count):
+                    row = tuple(view[index * width:(index + 1) * width])
+                    if row[0] > end:
+                        break
+                    rows.append(row)
+                return rows
+            finally:
+                view.release()
+
+    def _rows_pending(self, contract_address, name, width, start, end):
+        values = self._pending.get(contract_address, {}).get(name, ())
+        rows = [tuple(values[i:i + width]) for i in range(0, len(values), width)]
+        return [row for row in rows if start <= row[0] <= end]
+
+    def ticks(self, contract_address, start=0, end=float("inf")):
+        """Retourne les ticks bruts [(horodatage, prix, market cap)] entre start et end."""
+        return (
+            self._rows_on_disk(contract_address, "raw", RAW_WIDTH, start, end)
+            + self._rows_pending(contract_address, "raw", RAW_WIDTH, start, end)
+        )
+
+    def series(self, contract_address, resolution, start=0, end=float("inf")):
+        """Retourne les bougies [(début, ouverture, haut, bas, clôture, market cap)] d'une résolution."""
+        if contract_address not in self._restored:
+            self._restore_open(contract_address)
+        rows = (
+            self._rows_on_disk(contract_address, resolution, ROLLUP_WIDTH, start, end)
+            + self._rows_pending(contract_address, resolution, ROLLUP_WIDTH, start, end)
+        )
+        bucket = self._open.get((contract_address, resolution))
+        if bucket is not None and start <= bucket[0] <= end:
+            rows.append(tuple(bucket))
+        return rows
+
+    def price_at(self, contract_address, timestamp):
+        """Retourne le dernier tick (horodatage, prix, market cap) à ou avant timestamp, ou None."""
+        pending = self._rows_pending(contract_address, "raw", RAW_WIDTH, 0, timestamp)
+        if pending:
+            return pending[-1]
+        path = self._path(contract_address, "raw")
+        if not os.path.exists(path) or os.path.getsize(path) < RAW_WIDTH * 8:
+            return None
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped).cast("d")
+            try:
+                count = len(view) // RAW_WIDTH
+                # Premier tick strictement après timestamp, puis on recule d'un
+                index = _bisect_rows(view, RAW_WIDTH, count, timestamp, right=True) - 1
+                if index < 0:
+                    return None
+                return tuple(view[index * RAW_WIDTH:(index + 1) * RAW_WIDTH])
+            finally:
+                view.release()
+
+    def price_at_trade(self, transaction):
+        """Retourne le tick enregistré au moment d'une transaction de l'historique."""
+        timestamp = time.mktime(time.strptime(transaction["timestamp"], "%Y-%m-%d %H:%M:%S"))
+        return self.price_at(transaction["contract_address"], timestamp)
+
+
+def _bisect_rows(view, width, count, timestamp, right=False):
+    """Recherche dichotomique sur la première colonne (horodatage) d'un tableau à lignes fixes."""
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        value = view[middle * width]
+        if value < timestamp or (right and value == timestamp):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+price_history = PriceHistoryStore()
+price_feed.subscribe(price_history.on_price)
@@ -0,0 +1,143 @@
+import asyncio
+import time
+import constants
+from constants import (
+    PRICE_REFRESH_MIN_INTERVAL, PRICE_REFRESH_MAX_INTERVAL, PRICE_REFRESH_VIEW_TTL, HELD_TOKENS_REFRESH_INTERVAL,
+    WARM_UP_BATCH_SIZE,
+)
+from market_cache import market_cache
+from market_data import chunked, get_tokens_metadata, refresh_sol_price, refresh_token_prices
+from price_feed import price_feed
+from rate_limiter import PRIORITY_BACKGROUND, priority
+from sharding import shard_for
+from utils import wallet_cache
+
+
+VIEW_HALF_LIFE = 60  # secondes : demi-vie du compteur de consultations
+VOLATILITY_WEIGHT = 100  # une variation de 1 % par tick double la fréquence
+
+
+class PriceRefresher:
+    """Maintient à jour le cache de prix des tokens détenus ou consultés.
+
+    Chaque token a sa propre fréquence : plus il est volatil ou consulté,
+    plus il est rafraîchi souvent (entre PRICE_REFRESH_MIN_INTERVAL et
+    PRICE_REFRESH_MAX_INTERVAL). Les prix sont récupérés par requêtes
+    groupées et poussés dans le cache, si bien que les handlers lisent
+    presque toujours des données chaudes.
+
+    En multi-processus avec un cache partagé, chaque worker ne rafraîchit
+    que les tokens détenus dont il a la charge (shard_for(adresse) ==
+    shard_index, par défaut SHARD_INDEX) : les autres workers les lisent
+    dans le cache partagé.
+    """
+
+    def __init__(self, wallets, min_interval=PRICE_REFRESH_MIN_INTERVAL, max_interval=PRICE_REFRESH_MAX_INTERVAL,
+                 view_ttl=PRICE_REFRESH_VIEW_TTL, shard_index=None, workers=None, cache=market_cache):
+        self.wallets = wallets
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.view_ttl = view_ttl
+        self.shard_index = shard_index
+        self.workers = workers
+        self.cache = cache
+        self._stats = {}  # adresse -> {"price", "volatility", "views", "viewed_at", "next_due"}
+        self._held = set()
+        self._held_refreshed_at = 0
+
+    def _token_stats(self, contract_address):
+        stats = self._stats.get(contract_address)
+        if stats is None:
+            stats = {"price": None, "volatility": 0.0, "views": 0.0, "viewed_at": 0, "next_due": 0}
+            self._stats[contract_address] = stats
+        return stats
+
+    def interval(self, stats, now):
+        """Retourne l'intervalle de rafraîchissement d'un token selon sa volatilité et ses consultations."""
+        views = stats["views"] * 0.5 ** ((now - stats["viewed_at"]) / VIEW_HALF_LIFE)
+        score = 1 + stats["volatility"] * VOLATILITY_WEIGHT + views
+        return min(max(self.max_interval / score, self.min_interval), self.max_interval)
+
+    def on_price(self, contract_address, price):
+        """Abonné du flux de prix : met à jour la volatilité et reporte la prochaine échéance."""
+        stats = self._token_stats(contract_address)
+        price = float(price)
+        if stats["price"]:
+            change = abs(price / stats["price"] - 1)
+            stats["volatility"] = 0.7 * stats["volatility"] + 0.3 * change
+        stats["price"] = price
+        now = time.monotonic()
+        stats["next_due"] = now + self.interval(stats, now)
+
+    def on_view(self, contract_address):
+        """Abonné des consultations : un token regardé est rafraîchi plus souvent."""
+        stats = self._token_stats(contract_address)
+        now = time.monotonic()
+        stats["views"] = stats["views"] * 0.5 ** ((now - stats["viewed_at"]) / VIEW_HALF_LIFE) + 1
+        stats["viewed_at"] = now
+        stats["next_due"] = min(stats["next_due"], now + self.interval(stats, now))
+
+    async def _load_held(self):
+        held = await self.wallets.held_contract_addresses()
+        shard_index = constants.SHARD_INDEX if self.shard_index is None else self.shard_index
+        workers = constants.WORKERS if self.workers is None else self.workers
+        # Sans cache partagé, un worker ne profite pas des prix récupérés par les autres
+        if shard_index >= 0 and workers > 1 and self.cache.shared is not None:
+            held = {ca for ca in held if shard_for(ca, workers) == shard_index}
+        return held
+
+    async def refresh_held(self):
+        """Relit périodiquement l'ensemble des tokens détenus (dans un thread)."""
+        now = time.monotonic()
+        if now - self._held_refreshed_at < HELD_TOKENS_REFRESH_INTERVAL:
+            return
+        self._held_refreshed_at = now
+        self._held = await self._load_held()
+
+    def tracked(self, now):
+        """Retourne les tokens suivis : détenus, ou consultés récemment."""
+        recent = {ca for ca, stats in self._stats.items() if now - stats["viewed_at"] < self.view_ttl}
+        for ca in set(self._stats) - recent - self._held:
+            del self._stats[ca]
+        return self._held | recent
+
+    async def run_once(self):
+        """Rafraîchit en une requête groupée les tokens dont l'échéance est passée."""
+        await self.refresh_held()
+        now = time.monotonic()
+        due = [ca for ca in self.tracked(now) if self._token_stats(ca)["next_due"] <= now]
+        with priority(PRIORITY_BACKGROUND):
+            _, fresh = market_cache.peek(("sol_price",), record=False)
+            if not fresh:
+                await refresh_sol_price()
+            if due:
+                prices = await refresh_token_prices(due)
+                # Token sans prix : on réessaie plus tard plutôt qu'à chaque passage
+                for ca in due:
+                    if ca not in prices:
+                        self._token_stats(ca)["next_due"] = now + self.max_interval
+        return due
+
+    async def warm_up(self, batch_size=WARM_UP_BATCH_SIZE):
+        """Au démarrage : récupère prix et métadonnées de tous les tokens détenus, lot par lot.
+
+        Les lots partent l'un après l'autre à priorité basse, sous les budgets
+        des limiteurs : les requêtes des utilisateurs passent devant. Les
+        tokens détenus sont retirés du planning de run_once le temps du
+        préchauffage pour ne pas être demandés deux fois.
+        """
+        self._held = await self._load_held()
+        now = time.monotonic()
+        self._held_refreshed_at = now
+        for ca in self._held:
+            self._token_stats(ca)["next_due"] = now + self.max_interval
+        with priority(PRIORITY_BACKGROUND):
+            await refresh_sol_price()
+            for chunk in chunked(sorted(self._held), batch_size):
+                await asyncio.gather(get_tokens_metadata(chunk), refresh_token_prices(chunk))
+        return len(self._held)
+
+
+price_refresher = PriceRefresher(wallet_cache)
+price_feed.subscribe(price_refresher.on_price)
+price_feed.subscribe_views(price_refresher.on_view)
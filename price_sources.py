@@ -0,0 +1,46 @@
+from market_data import get_sol_price, get_token_information, get_tokens_information
+
+
+class LivePriceSource:
+    """Source de prix des trades : le cache de marché et les APIs en direct.
+
+    Une source de prix expose trois coroutines : sol_price(),
+    token_information(adresse) -> (prix, market cap, nom) et
+    tokens_information(adresses) -> {adresse: (prix, market cap, nom)} ; les
+    fonctions de trading acceptent n'importe quel objet qui les fournit.
+    """
+
+    async def sol_price(self):
+        return await get_sol_price()
+
+    async def token_information(self, contract_address):
+        return await get_token_information(contract_address)
+
+    async def tokens_information(self, contract_addresses):
+        return await get_tokens_information(contract_addresses)
+
+
+class ReplayPriceSource:
+    """Source de prix fixée à la main, pour rejouer des séries enregistrées ou synthétiques."""
+
+    def __init__(self, sol_price=None):
+        self._sol_price = sol_price
+        self._tokens = {}
+
+    def set_sol_price(self, price):
+        self._sol_price = price
+
+    def set_token(self, contract_address, price, market_cap, name=None):
+        self._tokens[contract_address] = (price, market_cap, name or contract_address)
+
+    async def sol_price(self):
+        return self._sol_price
+
+    async def token_information(self, contract_address):
+        return self._tokens.get(contract_address, (None, None, None))
+
+    async def tokens_information(self, contract_addresses):
+        return {ca: self._tokens.get(ca, (None, None, None)) for ca in contract_addresses}
+
+
+live_prices = LivePriceSource()
@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+import constants
+
+
+# Files de priorité : une valeur plus petite passe en premier
+PRIORITY_TRADE = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BACKGROUND = 2
+
+# Priorité des requêtes émises par la tâche courante
+request_priority = contextvars.ContextVar("request_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """Fixe la priorité des requêtes émises dans le bloc."""
+    token = request_priority.set(level)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+def with_priority(level):
+    """Décorateur : les requêtes émises par la coroutine décorée utilisent la priorité level."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with priority(level):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TokenBucket:
+    """Limiteur à jetons avec une file d'attente par niveau de priorité.
+
+    Un jeton n'est accordé à un appelant que si aucun appelant de priorité
+    plus haute n'attend, et dans l'ordre d'arrivée au sein d'une priorité.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0
+        self._queues = {level: [] for level in (PRIORITY_TRADE, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND)}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _is_next(self, waiter, level):
+        if any(self._queues[higher] for higher in self._queues if higher < level):
+            return False
+        return self._queues[level][0] is waiter
+
+    async def acquire(self, level=None):
+        """Attend qu'un jeton soit disponible pour la priorité donnée (celle de la tâche par défaut)."""
+        level = request_priority.get() if level is None else level
+        waiter = object()
+        queue = self._queues[level]
+        queue.append(waiter)
+        try:
+            while True:
+                self._refill()
+                now = time.monotonic()
+                if now >= self.blocked_until and self.tokens >= 1 and self._is_next(waiter, level):
+                    self.tokens -= 1
+                    return
+                delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.01)
+                await asyncio.sleep(delay)
+        finally:
+            queue.remove(waiter)
+
+    def pause(self, seconds):
+        """Suspend toutes les requêtes pendant seconds (ex. en-tête Retry-After)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class Limiters(dict):
+    """Limiteur de chaque API, créé à sa première requête depuis RATE_LIMITS (lu dans la configuration)."""
+
+    def __missing__(self, upstream):
+        rate, burst = constants.RATE_LIMITS[upstream]
+        limiter = self[upstream] = TokenBucket(rate, burst)
+        return limiter
+
+
+limiters = Limiters()
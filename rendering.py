@@ -0,0 +1,153 @@
+import functools
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from constants import TELEGRAM_MESSAGE_LIMIT, RENDER_CACHE_SIZE
+from portfolio import position_pnl
+from utils import format_large_number
+
+
+# Claviers statiques, construits une seule fois
+MAIN_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Add SOL", callback_data="add_sol"), InlineKeyboardButton("💰 Show Balance", callback_data="show_balance")],
+    [InlineKeyboardButton("🛒 Buy Token", callback_data="buy_token"), InlineKeyboardButton("📉 Sell Token", callback_data="sell_token")],
+    [InlineKeyboardButton("📜 History", callback_data="show_history")],
+])
+NAVIGATION_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("💰 Back to Balance", callback_data="back_to_balance"),
+     InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_menu")],
+])
+BACK_TO_MENU_BUTTON = InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_menu")
+
+WELCOME_TEMPLATE = (
+    "🚀 *Welcome to the Cudly Train Trading Bot!* 🚀\n\n"
+    "SOL Balance: {sol_balance:.2f} SOL (${sol_value:.2f})\n"
+    "PNL wallet: {pnl:+.2f} SOL (${pnl_value:.2f})\n\n"
+    "Select an option below to get started:"
+)
+
+
+def render_welcome(wallet, sol_price):
+    """Retourne le texte du menu principal."""
+    general_pnl = wallet.get("general_pnl", 0)
+    return WELCOME_TEMPLATE.format(
+        sol_balance=wallet["sol_balance"],
+        sol_value=wallet["sol_balance"] * sol_price,
+        pnl=general_pnl,
+        pnl_value=general_pnl * sol_price,
+    )
+
+
+def _page_buttons(prefix, page, page_count, next_label, previous_label):
+    # Ligne de navigation : page suivante (page + 1) puis précédente (page - 1)
+    buttons = []
+    if page + 1 < page_count:
+        buttons.append(InlineKeyboardButton(next_label, callback_data=f"{prefix}{page + 1}"))
+    if page > 0:
+        buttons.append(InlineKeyboardButton(previous_label, callback_data=f"{prefix}{page - 1}"))
+    return [buttons] if buttons else []
+
+
+@functools.lru_cache(maxsize=256)
+def balance_keyboard(live=False, page=0, page_count=1):
+    """Clavier de l'écran de solde : navigation entre pages, rafraîchissement et mode direct."""
+    live_button = (
+        InlineKeyboardButton("⏹ Stop Live", callback_data="stop_live") if live
+        else InlineKeyboardButton("📡 Live", callback_data="live_balance")
+    )
+    return InlineKeyboardMarkup(_page_buttons("balance_page_", page, page_count, "Next ➡️", "⬅️ Previous") + [
+        [InlineKeyboardButton("🔄 Refresh", callback_data="refresh_balance"), live_button],
+        [BACK_TO_MENU_BUTTON],
+    ])
+
+
+@functools.lru_cache(maxsize=256)
+def history_keyboard(page, page_count):
+    """Clavier de l'historique : pages plus anciennes / plus récentes et retour au menu."""
+    return InlineKeyboardMarkup(_page_buttons("history_", page, page_count, "⬅️ Older", "Newer ➡️") + [[BACK_TO_MENU_BUTTON]])
+
+
+def message_length(text):
+    """Longueur d'un texte telle que comptée par Telegram (unités UTF-16)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+@functools.lru_cache(maxsize=RENDER_CACHE_SIZE)
+def token_block(contract_address, name, quantity, purchase_market_cap, sol_spent, sol_sold, market_cap):
+    """Retourne (texte, longueur) du bloc d'un token dans le message de solde.
+
+    Mis en cache selon la position et la market cap courante : tant que ni
+    le prix ni la position ne changent, le bloc est réutilisé tel quel.
+    """
+    if not market_cap:
+        text = (
+            f"\n➤ Token Name: {name}\n"
+            f"   {contract_address}\n"
+            f"   Balance: {format_large_number(quantity)}\n"
+            f"   Data unavailable due to API limits.\n"
+        )
+        return text, message_length(text)
+
+    pnl, profit_loss = position_pnl({"purchase_market_cap": purchase_market_cap, "sol_spent": sol_spent}, market_cap)
+    pnl_line = (
+        f"   PNL: +{pnl:.2f}% (+{profit_loss:.2f} SOL)🟢\n" if pnl > 0
+        else f"   PNL: {pnl:.2f}% ({profit_loss:.2f} SOL)🔴\n"
+    )
+    text = (
+        f"\n➤ Token Name: {name}\n"
+        f"   {contract_address}\n"
+        f"   Balance: {format_large_number(quantity)}\n"
+        f"   Purchase Market Cap: ${format_large_number(purchase_market_cap)}\n"
+        f"   Current Market Cap: ${format_large_number(market_cap)}\n"
+        f"   Buys {sol_spent} SOL\n"
+        f"   Sells {sol_sold} SOL\n"
+        + pnl_line
+    )
+    return text, message_length(text)
+
+
+def paginate(header, blocks, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Répartit des blocs (texte, longueur) en pages commençant par header, sans couper de bloc."""
+    header_length = message_length(header)
+    pages, current, length = [], [header], header_length
+    for text, block_length in blocks:
+        if length + block_length > limit and len(current) > 1:
+            pages.append("".join(current))
+            current, length = [header], header_length
+        current.append(text)
+        length += block_length
+    pages.append("".join(current))
+    return pages
+
+
+def render_balance(wallet, sol_price, token_infos, page=0):
+    """Retourne (page demandée du message de solde, nombre de pages)."""
+    sol_balance = wallet["sol_balance"]
+    general_pnl = wallet.get("general_pnl", 0)
+    if general_pnl == 0:
+        pnl_line = f"General PNL: {general_pnl:.2f} SOL\n\n"
+    elif general_pnl > 0:
+        pnl_line = f"General PNL: +{general_pnl:.2f} SOL🟢\n\n"
+    else:
+        pnl_line = f"General PNL: {general_pnl:.2f} SOL🔴\n\n"
+    header = (
+        "🚀 Your Wallet Balance 🚀\n\n"
+        f"SOL Balance: {sol_balance:.2f} SOL (${sol_balance * sol_price:.2f})\n\n"
+        + pnl_line
+    )
+
+    tokens = wallet.get("tokens")
+    if not tokens:
+        return header + "No tokens in your wallet.\n", 1
+
+    blocks = []
+    for contract_address, data in tokens.items():
+        token_price, market_cap, token_name = token_infos.get(contract_address, (None, None, None))
+        if not token_price or not market_cap:
+            blocks.append(token_block(contract_address, data["name"], data["quantity"], None, None, None, None))
+        else:
+            blocks.append(token_block(
+                contract_address, token_name, data["quantity"], data["purchase_market_cap"],
+                data["sol_spent"], data["sol_sold"], market_cap,
+            ))
+    pages = paginate(header + "📊 Tokens in your wallet:\n", blocks)
+    page = min(max(page, 0), len(pages) - 1)
+    return pages[page], len(pages)
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import zlib
+from telegram import Update
+from telegram.ext import Application, BaseUpdateProcessor
+
+
+def shard_for(user_id, shard_count):
+    """Retourne le worker responsable d'un utilisateur ou d'un token (stable entre processus et redémarrages)."""
+    return zlib.crc32(str(user_id).encode()) % shard_count
+
+
+class ShardRouter(BaseUpdateProcessor):
+    """Processeur du routeur : transmet chaque mise à jour au worker de son utilisateur.
+
+    Toutes les mises à jour d'un utilisateur vont au même worker, qui les
+    traite dans l'ordre (UserOrderedUpdateProcessor) : l'ordre par
+    utilisateur est conservé, et son portefeuille n'est chargé que par ce
+    worker.
+    """
+
+    def __init__(self, queues):
+        super().__init__(max_concurrent_updates=len(queues))
+        self.queues = queues
+
+    async def do_process_update(self, update, coroutine):
+        # Le routeur n'exécute aucun handler : le traitement est fait par le worker
+        coroutine.close()
+        user = update.effective_user if isinstance(update, Update) else None
+        shard = shard_for(user.id, len(self.queues)) if user is not None else 0
+        self.queues[shard].put(json.dumps(update.to_dict()))
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+def run_worker(queue):
+    """Point d'entrée d'un worker : traite les mises à jour que lui transmet le routeur."""
+    # Importé ici : constants lit SHARD_INDEX dans l'environnement du worker
+    from main import build_application, configure_logging
+
+    configure_logging()
+    asyncio.run(_serve_worker(build_application(), queue))
+
+
+async def _serve_worker(application, queue):
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    try:
+        while True:
+            data = await asyncio.to_thread(queue.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(json.loads(data), application.bot))
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+
+def build_router(token, workers):
+    """Démarre les workers et retourne l'application du routeur, qui ne fait que recevoir les mises à jour."""
+    context = multiprocessing.get_context("spawn")
+    queues, processes = [], []
+    for shard in range(workers):
+        queue = context.Queue()
+        os.environ["SHARD_INDEX"] = str(shard)
+        process = context.Process(target=run_worker, args=(queue,), name=f"worker-{shard}")
+        process.start()
+        queues.append(queue)
+        processes.append(process)
+    os.environ.pop("SHARD_INDEX", None)
+
+    async def stop_workers(application):
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            await asyncio.to_thread(process.join)
+        logging.info(f"{len(processes)} workers stopped")
+
+    return Application.builder().token(token).concurrent_updates(ShardRouter(queues)).post_shutdown(stop_workers).build()
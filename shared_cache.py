@@ -0,0 +1,143 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import constants
+
+
+def _encode_key(key):
+    return json.dumps(list(key))
+
+
+class SQLiteSharedCache:
+    """Cache de marché partagé entre processus, dans une base SQLite (mode WAL).
+
+    Les entrées sont stockées avec leur horodatage (heure murale) et
+    expirent après leur TTL augmenté de la fenêtre « périmé mais servi ».
+    """
+
+    def __init__(self, path=None):
+        self.path = path or constants.SHARED_CACHE_DB
+        self._connection = None
+        self._lock = threading.Lock()  # la connexion est utilisée depuis les threads du pool
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self.open()
+        return self._connection
+
+    def open(self):
+        """Ouvre la base partagée ; appelé au démarrage, sinon au premier accès."""
+        if self._connection is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, fetched_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._connection = connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def get_many(self, keys):
+        """Retourne {clé: (valeur, horodatage)} pour les clés présentes et non expirées."""
+        encoded = {_encode_key(key): key for key in keys}
+        if not encoded:
+            return {}
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT key, value, fetched_at FROM entries WHERE expires_at > ? AND key IN ({','.join('?' * len(encoded))})",
+                (time.time(), *encoded),
+            ).fetchall()
+        return {encoded[key]: (json.loads(value), fetched_at) for key, value, fetched_at in rows}
+
+    def set_many(self, entries):
+        """Enregistre {clé: (valeur, horodatage, expiration)} ; horodatages en heure murale."""
+        with self._lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, fetched_at, expires_at) VALUES (?, ?, ?, ?)",
+                [(_encode_key(key), json.dumps(value), fetched_at, expires_at)
+                 for key, (value, fetched_at, expires_at) in entries.items()],
+            )
+            # Purge opportuniste des entrées expirées
+            self.connection.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, key):
+        with self._lock:
+            self.connection.execute("DELETE FROM entries WHERE key = ?", (_encode_key(key),))
+
+
+class RedisSharedCache:
+    """Cache de marché partagé via Redis (ou tout serveur compatible), avec expiration native."""
+
+    PREFIX = "market:"
+
+    def __init__(self, url=None):
+        self.url = url or constants.REDIS_URL
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def open(self):
+        """Vérifie la connexion au serveur dès le démarrage plutôt qu'à la première requête."""
+        self.client.ping()
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.client.mget([self.PREFIX + _encode_key(key) for key in keys])
+        result = {}
+        for key, raw in zip(keys, values):
+            if raw is not None:
+                value, fetched_at = json.loads(raw)
+                result[key] = (value, fetched_at)
+        return result
+
+    def set_many(self, entries):
+        pipeline = self.client.pipeline()
+        for key, (value, fetched_at, expires_at) in entries.items():
+            remaining = expires_at - time.time()
+            if remaining > 0:
+                pipeline.set(self.PREFIX + _encode_key(key), json.dumps([value, fetched_at]), ex=math.ceil(remaining))
+        pipeline.execute()
+
+    def delete(self, key):
+        self.client.delete(self.PREFIX + _encode_key(key))
+
+
+def create_shared_cache(backend=None):
+    """Instancie le cache partagé configuré ("local" : aucun, "sqlite" ou "redis")."""
+    backend = backend or constants.CACHE_BACKEND
+    if backend == "local":
+        return None
+    if backend == "sqlite":
+        return SQLiteSharedCache()
+    if backend == "redis":
+        return RedisSharedCache()
+    raise ValueError(f"Unknown cache backend: {backend}")
@@ -0,0 +1,341 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import constants
+from history_log import HistoryLog
+
+
+def empty_wallet():
+    """Retourne un portefeuille vide."""
+    return {"sol_balance": 0, "tokens": {}, "general_pnl": 0}
+
+
+class JsonWalletStore:
+    """Stockage historique : un fichier wallet_{user_id}.json par utilisateur.
+
+    Les transactions sont conservées à part, dans un HistoryLog en ajout seul.
+    """
+
+    def __init__(self, directory=None, history=None):
+        self.directory = directory or constants.WALLETS_DIR
+        self.history = history or HistoryLog()
+        self._directory_ready = False
+
+    def open(self):
+        """Crée le répertoire des portefeuilles ; appelé au démarrage, sinon au premier accès."""
+        if not self._directory_ready:
+            os.makedirs(self.directory, exist_ok=True)
+            self._directory_ready = True
+
+    def close(self):
+        pass
+
+    def get_wallet_file(self, user_id):
+        """Retourne le chemin du fichier de portefeuille pour un utilisateur donné."""
+        if not self._directory_ready:
+            self.open()
+        return os.path.join(self.directory, f"wallet_{user_id}.json")
+
+    def read_wallet(self, user_id):
+        """Lit le fichier du portefeuille tel quel, historique intégré des anciens fichiers compris."""
+        wallet_file = self.get_wallet_file(user_id)
+        if not os.path.exists(wallet_file):
+            return empty_wallet()
+        with open(wallet_file, "r") as file:
+            return json.load(file)
+
+    def load(self, user_id):
+        wallet = self.read_wallet(user_id)
+        # Anciens fichiers : l'historique était stocké dans le portefeuille
+        legacy_history = wallet.pop("history", None)
+        if legacy_history and self.history.count(user_id) == 0:
+            self.history.append(user_id, legacy_history)
+        return wallet
+
+    def save(self, user_id, wallet, new_history=()):
+        self.history.append(user_id, list(new_history))
+        with open(self.get_wallet_file(user_id), "w") as file:
+            json.dump({key: value for key, value in wallet.items() if key != "history"}, file, indent=4)
+
+    def history_count(self, user_id):
+        return self.history.count(user_id)
+
+    def history_page(self, user_id, page, page_size):
+        return self.history.read_page(user_id, page, page_size)
+
+    def held_contract_addresses(self):
+        # Parcourt tous les fichiers : à n'appeler qu'en arrière-plan
+        addresses = set()
+        for user_id in self.user_ids():
+            try:
+                addresses.update(self.read_wallet(user_id).get("tokens", {}))
+            except (OSError, ValueError) as e:
+                logging.error(f"Error reading wallet for user {user_id}: {e}")
+        return addresses
+
+    def user_ids(self):
+        if not os.path.exists(self.directory):
+            return []
+        return [
+            name[len("wallet_"):-len(".json")]
+            for name in os.listdir(self.directory)
+            if name.startswith("wallet_") and name.endswith(".json")
+        ]
+
+
+class SQLiteWalletStore:
+    """Stockage SQLite (mode WAL) : soldes, positions et historique dans des tables indexées.
+
+    Une sauvegarde ne réécrit que la ligne du portefeuille, ses positions et
+    les nouvelles transactions, dans une seule transaction.
+    """
+
+    POSITION_FIELDS = ("name", "quantity", "purchase_market_cap", "purchase_price", "sol_spent", "sol_sold")
+    HISTORY_FIELDS = ("type", "token", "contract_address", "quantity", "sol_amount", "price_usd", "pnl", "timestamp")
+
+    def __init__(self, path=None):
+        self.path = path or constants.WALLETS_DB
+        self._connection = None
+        # Une seule connexion, partagée par la boucle, le pool de threads et les écritures par lots
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self.open()
+        return self._connection
+
+    def open(self):
+        """Ouvre la base et crée le schéma ; appelé au démarrage, sinon au premier accès."""
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS wallets (
+                user_id TEXT PRIMARY KEY,
+                sol_balance REAL NOT NULL DEFAULT 0,
+                general_pnl REAL NOT NULL DEFAULT 0,
+                stats TEXT
+            );
+            CREATE TABLE IF NOT EXISTS positions (
+                user_id TEXT NOT NULL,
+                contract_address TEXT NOT NULL,
+                name TEXT,
+                quantity REAL NOT NULL,
+                purchase_market_cap REAL,
+                purchase_price REAL,
+                sol_spent REAL NOT NULL DEFAULT 0,
+                sol_sold REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, contract_address)
+            );
+            CREATE INDEX IF NOT EXISTS positions_by_token ON positions (contract_address);
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                token TEXT,
+                contract_address TEXT,
+                quantity REAL,
+                sol_amount REAL,
+                price_usd REAL,
+                pnl REAL,
+                timestamp TEXT
+            );
+            CREATE INDEX IF NOT EXISTS history_by_user ON history (user_id, id);
+            """
+        )
+        # Bases créées avant l'ajout des statistiques agrégées
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(wallets)")}
+        if "stats" not in columns:
+            connection.execute("ALTER TABLE wallets ADD COLUMN stats TEXT")
+        return connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def load(self, user_id):
+        user_id = str(user_id)
+        wallet = empty_wallet()
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT sol_balance, general_pnl, stats FROM wallets WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            positions = self.connection.execute("SELECT * FROM positions WHERE user_id = ?", (user_id,)).fetchall()
+        if row is not None:
+            wallet["sol_balance"] = row["sol_balance"]
+            wallet["general_pnl"] = row["general_pnl"]
+            if row["stats"]:
+                wallet["stats"] = json.loads(row["stats"])
+        for position in positions:
+            wallet["tokens"][position["contract_address"]] = {field: position[field] for field in self.POSITION_FIELDS}
+        return wallet
+
+    def read_wallet(self, user_id):
+        """Lit un portefeuille sans effet de bord (ici, identique à load)."""
+        return self.load(user_id)
+
+    def save(self, user_id, wallet, new_history=()):
+        user_id = str(user_id)
+        tokens = wallet.get("tokens", {})
+        with self._lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute(
+                "INSERT INTO wallets (user_id, sol_balance, general_pnl, stats) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET sol_balance = excluded.sol_balance, "
+                "general_pnl = excluded.general_pnl, stats = excluded.stats",
+                (user_id, wallet["sol_balance"], wallet.get("general_pnl", 0),
+                 json.dumps(wallet["stats"]) if "stats" in wallet else None),
+            )
+            placeholders = ",".join("?" * len(tokens))
+            self.connection.execute(
+                f"DELETE FROM positions WHERE user_id = ? AND contract_address NOT IN ({placeholders})",
+                (user_id, *tokens.keys()),
+            )
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO positions (user_id, contract_address, {', '.join(self.POSITION_FIELDS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(self.POSITION_FIELDS))})",
+                [(user_id, ca, *(data.get(field) for field in self.POSITION_FIELDS)) for ca, data in tokens.items()],
+            )
+            self.connection.executemany(
+                f"INSERT INTO history (user_id, {', '.join(self.HISTORY_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' * len(self.HISTORY_FIELDS))})",
+                [(user_id, *(tx.get(field) for field in self.HISTORY_FIELDS)) for tx in new_history],
+            )
+
+    def history_count(self, user_id):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM history WHERE user_id = ?", (str(user_id),)).fetchone()[0]
+
+    def history_page(self, user_id, page, page_size):
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT * FROM history WHERE user_id = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (str(user_id), page_size, page * page_size),
+            ).fetchall()
+        return [
+            {field: row[field] for field in self.HISTORY_FIELDS if row[field] is not None}
+            for row in reversed(rows)
+        ]
+
+    def held_contract_addresses(self):
+        with self._lock:
+            rows = self.connection.execute("SELECT DISTINCT contract_address FROM positions").fetchall()
+        return {row["contract_address"] for row in rows}
+
+    def user_ids(self):
+        with self._lock:
+            return [row["user_id"] for row in self.connection.execute("SELECT user_id FROM wallets")]
+
+
+class MemoryWalletStore:
+    """Portefeuilles en mémoire, sans aucune écriture disque (replays, backtests).
+
+    load() retourne l'objet stocké lui-même : c'est WalletCache qui fournit des
+    copies aux handlers, le moteur de replay travaille directement dessus.
+    """
+
+    def __init__(self, keep_history=True):
+        self.keep_history = keep_history
+        self.wallets = {}
+        self.history = {}
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def load(self, user_id):
+        user_id = str(user_id)
+        wallet = self.wallets.get(user_id)
+        if wallet is None:
+            wallet = self.wallets[user_id] = empty_wallet()
+        return wallet
+
+    def read_wallet(self, user_id):
+        """Lit un portefeuille sans l'ajouter au stockage s'il n'existe pas."""
+        return self.wallets.get(str(user_id)) or empty_wallet()
+
+    def save(self, user_id, wallet, new_history=()):
+        user_id = str(user_id)
+        self.wallets[user_id] = wallet
+        if self.keep_history and new_history:
+            self.history.setdefault(user_id, []).extend(new_history)
+
+    def history_count(self, user_id):
+        return len(self.history.get(str(user_id), ()))
+
+    def history_page(self, user_id, page, page_size):
+        history = self.history.get(str(user_id), [])
+        end = len(history) - page * page_size
+        return history[max(end - page_size, 0):max(end, 0)]
+
+    def held_contract_addresses(self):
+        return {address for wallet in self.wallets.values() for address in wallet["tokens"]}
+
+    def user_ids(self):
+        return list(self.wallets)
+
+
+def create_wallet_store(backend=None):
+    """Instancie le stockage de portefeuilles configuré ("json", "sqlite" ou "memory")."""
+    backend = backend or constants.STORAGE_BACKEND
+    if backend == "memory":
+        return MemoryWalletStore()
+    if backend == "sqlite":
+        return SQLiteWalletStore()
+    if backend == "json":
+        return JsonWalletStore()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def migrate_json_wallets(source_dir=None, target=None):
+    """Importe les fichiers wallet_{user_id}.json de source_dir dans le stockage cible.
+
+    L'historique intégré des anciens fichiers va directement dans le stockage
+    cible : la migration n'écrit rien dans le répertoire d'historique source.
+    """
+    source = JsonWalletStore(source_dir)
+    target = target or SQLiteWalletStore()
+    already_migrated = set(target.user_ids())
+    migrated = 0
+    for user_id in source.user_ids():
+        if user_id in already_migrated:
+            continue
+        try:
+            wallet = source.read_wallet(user_id)
+        except (OSError, ValueError) as e:
+            logging.error(f"Skipping unreadable wallet for user {user_id}: {e}")
+            continue
+        legacy_history = wallet.pop("history", None) or []
+        history_count = source.history_count(user_id)
+        history = source.history.read_range(user_id, 0, history_count) if history_count else legacy_history
+        target.save(user_id, wallet, history)
+        migrated += 1
+    return migrated
+
+
+if __name__ == "__main__":
+    # python storage.py migrate [dossier_source]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        target = SQLiteWalletStore()
+        count = migrate_json_wallets(*sys.argv[2:3], target=target)
+        print(f"Migrated {count} wallets to {target.path}")
+    else:
+        print("Usage: python storage.py migrate [wallets_dir]")
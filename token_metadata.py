@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import constants
+from constants import TOKEN_METADATA_MISSING_TTL, TOKEN_METADATA_TTL
+from metrics import cache_lookups
+
+
+class TokenMetadataStore:
+    """Métadonnées des tokens (nom, supply, décimales), persistées sur disque.
+
+    Ces données changent rarement : elles sont gardées en mémoire et
+    rafraîchies au plus une fois par TOKEN_METADATA_TTL. Les modifications
+    sont écrites sur disque par flush_async (tâche périodique), jamais
+    depuis la boucle.
+    """
+
+    def __init__(self, path=None, ttl=TOKEN_METADATA_TTL, missing_ttl=TOKEN_METADATA_MISSING_TTL):
+        self._path = path
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self._metadata = None
+        self._dirty = False
+        self._missing = {}  # adresse -> fin du cache négatif (en mémoire seulement)
+
+    @property
+    def path(self):
+        # Lu dans la configuration au premier accès, pas à l'import
+        return self._path or constants.TOKEN_METADATA_FILE
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading token metadata from {self.path}: {e}")
+            return {}
+
+    def _load(self):
+        if self._metadata is None:
+            self._metadata = self._read()
+        return self._metadata
+
+    async def load_async(self):
+        """Charge le fichier dans un thread ; les entrées enregistrées entre-temps sont gardées."""
+        metadata = await asyncio.to_thread(self._read)
+        if self._metadata is not None:
+            metadata.update(self._metadata)
+        self._metadata = metadata
+        return len(metadata)
+
+    def _save(self, metadata):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # Écriture atomique : un arrêt brutal ne laisse pas de fichier tronqué
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(metadata, file)
+        os.replace(tmp_path, self.path)
+
+    def get(self, contract_address, record=True):
+        """Retourne les métadonnées d'un token, ou None si absentes ou trop anciennes.
+
+        record=False pour les lectures internes (ticks de prix, valorisation) :
+        elles ne comptent pas dans cache_lookups_total.
+        """
+        metadata = self._load().get(contract_address)
+        if metadata is None or time.time() - metadata["updated_at"] > self.ttl:
+            if record:
+                cache_lookups.inc(cache="token_metadata", result="miss")
+            return None
+        if record:
+            cache_lookups.inc(cache="token_metadata", result="hit")
+        return metadata
+
+    def mark_missing(self, contract_addresses):
+        """Note des tokens introuvables : ils ne sont pas redemandés pendant missing_ttl."""
+        expires_at = time.monotonic() + self.missing_ttl
+        for contract_address in contract_addresses:
+            self._missing[contract_address] = expires_at
+
+    def is_missing(self, contract_address):
+        """Indique si un token a été récemment noté comme introuvable."""
+        expires_at = self._missing.get(contract_address)
+        if expires_at is None:
+            return False
+        if time.monotonic() >= expires_at:
+            del self._missing[contract_address]
+            return False
+        return True
+
+    def set(self, contract_address, name, supply, decimals):
+        """Enregistre les métadonnées d'un token (écrites au prochain flush)."""
+        return self.set_many({contract_address: (name, supply, decimals)})[contract_address]
+
+    def set_many(self, entries):
+        """Enregistre {adresse: (nom, supply, décimales)} en mémoire et marque le fichier à réécrire."""
+        now = time.time()
+        metadata = self._load()
+        updated = {}
+        for contract_address, (name, supply, decimals) in entries.items():
+            updated[contract_address] = {"name": name, "supply": supply, "decimals": decimals, "updated_at": now}
+        metadata.update(updated)
+        for contract_address in updated:
+            self._missing.pop(contract_address, None)
+        if updated:
+            self._dirty = True
+        return updated
+
+    async def flush_async(self):
+        """Réécrit le fichier dans un thread s'il a été modifié depuis la dernière écriture."""
+        if not self._dirty:
+            return
+        self._dirty = False
+        # Copie prise sur la boucle : le thread n'itère pas le dictionnaire vivant
+        snapshot = dict(self._metadata)
+        try:
+            await asyncio.to_thread(self._save, snapshot)
+        except OSError as e:
+            self._dirty = True
+            logging.error(f"Error saving token metadata to {self.path}: {e}")
+
+token_metadata = TokenMetadataStore()
@@ -1,221 +1,131 @@
-import requests
+import asyncio
 import logging
-import time
-from cachetools import TTLCache, cached
-from colorama import Fore, Style, init
-from constants import BINANCE_API_URL, DEX_API_URL, BIRDEYE_API_URL, BIRDEYE_API_KEY, CACHE_TTL, CACHE_MAXSIZE
-from utils import cache, format_large_number, load_wallet, save_wallet
-
-
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-
-RPC_URL = "https://api.mainnet-beta.solana.com"
-
-def get_sol_price():
-    try:
-        response = requests.get(BINANCE_API_URL)
-        response.raise_for_status()
-        price_data = response.json()
-        return float(price_data.get("price", 0))
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching Solana price from Binance API: {e}")
-        return None
-
-@cached(cache=TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL))
-def get_token_information(contract_address):
-    birdeye_url = f"{BIRDEYE_API_URL}{contract_address}"
-    headers = {"accept": "application/json", "x-chain": "solana", "X-API-KEY": BIRDEYE_API_KEY}
-    for attempt in range(3):
-        try:
-            response = requests.get(birdeye_url, headers=headers)
-            response.raise_for_status()
-            price_data = response.json()
-            token_price = price_data.get("data", {}).get("value")
-            if token_price is None:
-                logging.error(f"Birdeye API did not return a valid price for {contract_address}")
-                return None, None, None
-            break
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:
-                logging.warning(f"Too Many Requests from Birdeye API. Retrying in {2 ** attempt} seconds...")
-                time.sleep(2 ** attempt)
-            else:
-                logging.error(f"Error fetching token price from Birdeye API: {e}")
-                return None, None, None
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching token price from Birdeye API: {e}")
-            return None, None, None
-    else:
-        logging.error(f"Failed to fetch price from Birdeye after retries for {contract_address}")
-        return None, None, None
-
-    payload = {"jsonrpc": "2.0", "id": 1, "method": "getTokenSupply", "params": [contract_address]}
-    try:
-        response = requests.post(RPC_URL, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        if "result" in data and "value" in data["result"]:
-            supply_in_lamports = int(data["result"]["value"]["amount"])
-            total_supply = supply_in_lamports / 10**6
-        else:
-            logging.error(f"No supply data found in RPC response for {contract_address}")
-            return None, None, None
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching token supply from RPC: {e}")
-        return None, None, None
-
-    dex_url = f"{DEX_API_URL}{contract_address}"
-    try:
-        response = requests.get(dex_url)
-        response.raise_for_status()
-        data = response.json()
-        if not data or not isinstance(data, list) or len(data) == 0:
-            logging.error(f"No data found in DexScreener response for {contract_address}")
-            return None, None, None
-        token_data = data[0]
-        token_name = token_data["baseToken"]["name"]
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching token name from DexScreener: {e}")
-        return None, None, None
-
-    real_market_cap = float(token_price) * total_supply if token_price and total_supply else None
-    return token_price, real_market_cap, token_name
-
-def add_sol(user_id, amount):
+import os
+import constants
+from constants import LEADERBOARD_SIZE
+from leaderboard import leaderboard
+from limit_orders import LimitOrderEngine, OrderBook
+from market_data import get_sol_price, get_token_information, get_tokens_information, invalidate_token_information
+from portfolio import apply_buy, apply_sell, get_stats, record_deposit, time_weighted_return, win_rate
+from price_feed import price_feed
+from price_sources import live_prices
+from rate_limiter import PRIORITY_TRADE, with_priority
+from rendering import render_balance
+from sharding import shard_for
+from utils import format_large_number, get_history_page, load_wallet, save_wallet, wallet_cache, with_wallet_lock
+
+
+@with_wallet_lock
+async def add_sol(user_id, amount):
     try:
         amount = float(amount)
         if amount <= 0:
             return "Amount must be greater than zero."
-        wallet = load_wallet(user_id)
+        wallet = await load_wallet(user_id)
+        record_deposit(wallet, amount)
         wallet["sol_balance"] += amount
         save_wallet(user_id, wallet)
         return f"Added {amount} SOL to your wallet."
     except ValueError:
         return "Invalid amount. Please enter a number."
 
-def refresh_token_info(contract_address):
+async def refresh_token_info(contract_address):
     try:
-        cache.pop(contract_address, None)
-        return get_token_information(contract_address)
+        invalidate_token_information(contract_address)
+        return await get_token_information(contract_address)
     except Exception as e:
         logging.error(f"Error refreshing token info for {contract_address}: {e}")
         return None, None, None
 
-def buy_token(user_id, contract_address, amount_sol):
-    wallet = load_wallet(user_id)
-    sol_balance = wallet["sol_balance"]
-    
-    sol_price = get_sol_price()
-    if not sol_price:
-        return "Unable to fetch Solana price. Try again later."
+def execute_buy(wallet, contract_address, amount_sol, sol_price, token_price, market_cap, token_name, timestamp=None):
+    """Valide et applique un achat à wallet, sans verrou, réseau ni écriture ; retourne (message, transaction ou None).
 
-    token_price, market_cap, token_name = get_token_information(contract_address)
+    Cœur de buy_token, appelé directement par les replays sur leurs portefeuilles.
+    """
+    if not sol_price:
+        return "Unable to fetch Solana price. Try again later.", None
     if not token_price or not market_cap:
-        return f"Unable to fetch data for token with contract address: {contract_address}. Try again later."
-    
+        return f"Unable to fetch data for token with contract address: {contract_address}. Try again later.", None
+
     try:
         amount_sol = float(amount_sol)
         if amount_sol <= 0:
-            return "Amount must be greater than zero."
-        if amount_sol > sol_balance:
-            return "Not enough SOL in your wallet."
+            return "Amount must be greater than zero.", None
+        if amount_sol > wallet["sol_balance"]:
+            return "Not enough SOL in your wallet.", None
 
-        num_tokens = (sol_price / token_price) * amount_sol
-
-        wallet["sol_balance"] -= amount_sol
-        if contract_address not in wallet["tokens"]:
-            wallet["tokens"][contract_address] = {"name": token_name, "quantity": 0, "purchase_market_cap": market_cap, "purchase_price": token_price, "sol_spent": 0, "sol_sold": 0}
-
-        if wallet["tokens"][contract_address]["quantity"] == 0:
-            wallet["tokens"][contract_address]["purchase_market_cap"] = market_cap
-
-        AVG_MarketCap = (wallet["tokens"][contract_address]["purchase_market_cap"] * wallet["tokens"][contract_address]["quantity"] + market_cap * num_tokens) / (wallet["tokens"][contract_address]["quantity"] + num_tokens)
-        
-        wallet["tokens"][contract_address]["quantity"] += round(num_tokens, 2)
-        wallet["tokens"][contract_address]["purchase_market_cap"] = AVG_MarketCap
-        wallet["tokens"][contract_address]["sol_spent"] += amount_sol
-
-        # Ajouter à l'historique
-        if "history" not in wallet:
-            wallet["history"] = []
-        wallet["history"].append({
-            "type": "buy",
-            "token": token_name,
-            "contract_address": contract_address,
-            "quantity": round(num_tokens, 2),
-            "sol_amount": amount_sol,
-            "price_usd": token_price,
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-        })
-
-        save_wallet(user_id, wallet)
+        num_tokens, transaction = apply_buy(wallet, contract_address, amount_sol, sol_price, token_price, market_cap, token_name, timestamp)
         return (
             f"You have purchased:\n"
             f"Token Name: {token_name}\n"
             f"Market Cap: ${format_large_number(market_cap)}\n"
             f"Number of tokens: {format_large_number(num_tokens)}\n"
             f"SOL used: {amount_sol} SOL (${amount_sol * sol_price:.2f})."
-        )
+        ), transaction
     except ValueError:
-        return "Invalid amount. Please enter a valid number."
-
-def sell_token(user_id, contract_address, amount_tokens):
-    """Vend un token pour du SOL pour un utilisateur donné."""
-    wallet = load_wallet(user_id)
-    
+        return "Invalid amount. Please enter a valid number.", None
+
+@with_wallet_lock
+@with_priority(PRIORITY_TRADE)
+async def buy_token(user_id, contract_address, amount_sol, prices=live_prices):
+    """Achète un token ; prices est remplaçable (voir price_sources.py)."""
+    wallet = await load_wallet(user_id)
+    sol_price = await prices.sol_price()
+    token_price, market_cap, token_name = await prices.token_information(contract_address) if sol_price else (None, None, None)
+    message, transaction = execute_buy(wallet, contract_address, amount_sol, sol_price, token_price, market_cap, token_name)
+    if transaction is not None:
+        save_wallet(user_id, wallet, [transaction])
+        leaderboard.record_wallet(user_id, wallet)
+    return message
+
+def sell_error(wallet, contract_address):
+    """Retourne le message d'erreur si wallet n'a rien à vendre pour ce token, sinon None."""
     if contract_address not in wallet["tokens"]:
         return f"No tokens found for contract address: {contract_address}"
-    
+    if wallet["tokens"][contract_address]["quantity"] <= 0.01:
+        return f"No tokens available to sell for contract address: {contract_address}"
+    return None
+
+def execute_sell(wallet, contract_address, amount_tokens, sol_price, token_price, token_name, timestamp=None):
+    """Valide et applique une vente à wallet, sans verrou, réseau ni écriture ; retourne (message, transaction ou None).
+
+    amount_tokens est une quantité ou un pourcentage ("50%") de la position.
+    Cœur de sell_token, appelé directement par les replays sur leurs portefeuilles.
+    """
+    error = sell_error(wallet, contract_address)
+    if error:
+        return error, None
     token_data = wallet["tokens"][contract_address]
     token_quantity = token_data["quantity"]
-    
-    if token_quantity <= 0.01:
-        return f"No tokens available to sell for contract address: {contract_address}"
 
-    token_price, _, token_name = get_token_information(contract_address)
     if not token_price:
-        return f"Unable to fetch data for token with contract address: {contract_address}. Try again later."
-    
+        return f"Unable to fetch data for token with contract address: {contract_address}. Try again later.", None
+
     try:
         if "%" in amount_tokens:
             percentage = float(amount_tokens.replace("%", "").strip())
             if 0 <= percentage <= 100:
                 amount_tokens = (percentage / 100) * token_quantity 
             else:
-                return "Error: Percentage must be between 0 and 100."
+                return "Error: Percentage must be between 0 and 100.", None
         else:
             amount_tokens = float(amount_tokens)
             if amount_tokens <= 0.01:
-                return "Amount must be greater than zero."
+                return "Amount must be greater than zero.", None
             if amount_tokens > token_quantity:
-                return "Not enough tokens in your wallet."
+                return "Not enough tokens in your wallet.", None
         
-        sol_price = get_sol_price()
         if not sol_price:
-            return "Unable to fetch Solana price. Try again later."
+            return "Unable to fetch Solana price. Try again later.", None
 
-        amount_sol = (token_price / sol_price) * amount_tokens
-        
-        # Calcul du PNL pour cette vente
-        proportion_sold = amount_tokens / token_quantity
-        sol_spent_for_sold = token_data["sol_spent"] * proportion_sold
-        trade_pnl = amount_sol - sol_spent_for_sold  # PNL de cette transaction
-        
-        # Mise à jour du PNL général et du sol_balance (toujours exécuté)
-        wallet["general_pnl"] = wallet.get("general_pnl", 0) + trade_pnl
-        wallet["sol_balance"] += amount_sol  # Déplacé ici pour tous les cas
+        amount_sol, trade_pnl, transaction = apply_sell(wallet, contract_address, amount_tokens, sol_price, token_price, token_name, timestamp)
 
-        # Gestion de la quantité restante
-        if wallet["tokens"][contract_address]["quantity"] - amount_tokens < 0.01:
-            del wallet["tokens"][contract_address]
+        if token_quantity - amount_tokens < 0.01:
             result = f"You have sold all {token_name} tokens ({amount_tokens:.2f}) for {amount_sol:.2f} SOL (${amount_sol * sol_price:.2f})."
         else:
             sol_pnl = ((amount_sol - token_data["sol_spent"]) / token_data["sol_spent"]) * 100
             Profit_Loss = (sol_pnl * token_data["sol_spent"]) / 100
             
-            wallet["tokens"][contract_address]["quantity"] -= amount_tokens
-            wallet["tokens"][contract_address]["sol_sold"] += amount_sol
-            
             result = (
                 f"You have sold {amount_tokens:.2f} of {token_name} tokens for {amount_sol:.2f} SOL (${amount_sol * sol_price:.2f}).\n"
             )
@@ -224,89 +134,189 @@ def sell_token(user_id, contract_address, amount_tokens):
             else:
                 result += f"You lost {format_large_number(Profit_Loss)} ({sol_pnl:.2f}%) SOL."
             
-            if wallet["tokens"][contract_address]["quantity"] < 0.01:
-                del wallet["tokens"][contract_address]
+            if contract_address not in wallet["tokens"]:
                 result += "\nRemaining quantity too small, token removed from wallet."
-
-        # Ajouter à l'historique
-        if "history" not in wallet:
-            wallet["history"] = []
-        wallet["history"].append({
-            "type": "sell",
-            "token": token_name,
-            "contract_address": contract_address,
-            "quantity": amount_tokens,
-            "sol_amount": amount_sol,
-            "price_usd": token_price,
-            "pnl": trade_pnl,
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-        })
-
-        save_wallet(user_id, wallet)
-        return result
+        return result, transaction
+    except ValueError:
+        return "Invalid amount. Please enter a valid number.", None
+
+@with_wallet_lock
+@with_priority(PRIORITY_TRADE)
+async def sell_token(user_id, contract_address, amount_tokens, prices=live_prices):
+    """Vend un token pour du SOL pour un utilisateur donné ; prices est remplaçable (voir price_sources.py)."""
+    wallet = await load_wallet(user_id)
+    error = sell_error(wallet, contract_address)
+    if error:
+        return error
+    token_price, _, token_name = await prices.token_information(contract_address)
+    sol_price = await prices.sol_price() if token_price else None
+    message, transaction = execute_sell(wallet, contract_address, amount_tokens, sol_price, token_price, token_name)
+    if transaction is not None:
+        save_wallet(user_id, wallet, [transaction])
+        leaderboard.record_wallet(user_id, wallet)
+    return message
+
+@with_wallet_lock
+@with_priority(PRIORITY_TRADE)
+async def buy_tokens(user_id, orders, prices=live_prices):
+    """Achète plusieurs tokens en une opération : orders est une liste de (adresse, montant en SOL).
+
+    Toutes les jambes sont valorisées par une seule requête groupée et un
+    seul prix du SOL, puis appliquées ensemble avec une seule sauvegarde :
+    si l'une d'elles est invalide, rien n'est acheté.
+    """
+    amounts = {}
+    try:
+        for contract_address, amount_sol in orders:
+            amount_sol = float(amount_sol)
+            if amount_sol <= 0:
+                return "Amount must be greater than zero."
+            amounts[contract_address] = amounts.get(contract_address, 0) + amount_sol
     except ValueError:
         return "Invalid amount. Please enter a valid number."
+    if not amounts:
+        return "No tokens to buy."
 
-init(autoreset=True)
+    wallet = await load_wallet(user_id)
+    total_sol = sum(amounts.values())
+    if total_sol > wallet["sol_balance"]:
+        return f"Not enough SOL in your wallet ({total_sol} SOL needed, {wallet['sol_balance']:.2f} available)."
 
-def show_balance(user_id):
-    wallet = load_wallet(user_id)
-    sol_balance = wallet["sol_balance"]
-    general_pnl = wallet.get("general_pnl", 0)
-    sol_price = get_sol_price()
+    sol_price, token_infos = await asyncio.gather(prices.sol_price(), prices.tokens_information(list(amounts)))
+    if not sol_price:
+        return "Unable to fetch Solana price. Try again later."
+    unpriced = [ca for ca in amounts if not token_infos.get(ca, (None, None))[0] or not token_infos[ca][1]]
+    if unpriced:
+        return "Unable to fetch data for: " + ", ".join(unpriced) + ". Nothing was bought."
+
+    transactions = []
+    result = "You have purchased:\n"
+    for contract_address, amount_sol in amounts.items():
+        token_price, market_cap, token_name = token_infos[contract_address]
+        num_tokens, transaction = apply_buy(wallet, contract_address, amount_sol, sol_price, token_price, market_cap, token_name)
+        transactions.append(transaction)
+        result += f"   {token_name}: {format_large_number(num_tokens)} tokens for {amount_sol} SOL (MC ${format_large_number(market_cap)})\n"
+
+    save_wallet(user_id, wallet, transactions)
+    leaderboard.record_wallet(user_id, wallet)
+    return result + f"Total: {total_sol} SOL (${total_sol * sol_price:.2f})."
+
+@with_wallet_lock
+@with_priority(PRIORITY_TRADE)
+async def sell_all_tokens(user_id, percentage, prices=live_prices):
+    """Vend le même pourcentage de chaque position, avec une seule valorisation groupée et une seule sauvegarde.
+
+    Les tokens dont le prix est indisponible sont laissés intacts et signalés.
+    """
+    try:
+        percentage = float(str(percentage).replace("%", "").strip())
+    except ValueError:
+        return "Invalid percentage. Please enter a number between 0 and 100."
+    if not 0 < percentage <= 100:
+        return "Error: Percentage must be between 0 and 100."
 
-    balance_message = (
-        "🚀 Your Wallet Balance 🚀\n\n"
-        f"SOL Balance: {sol_balance:.2f} SOL (${sol_balance * sol_price:.2f})\n\n")
-    
-    if general_pnl == 0:
-        balance_message += f"General PNL: {general_pnl:.2f} SOL\n\n"
-    elif general_pnl > 0:
-        balance_message += f"General PNL: +{general_pnl:.2f} SOL🟢\n\n"
-    else:
-        balance_message += f"General PNL: {general_pnl:.2f} SOL🔴\n\n"
-
-    if "tokens" in wallet and wallet["tokens"]:
-        balance_message += "📊 Tokens in your wallet:\n"
-        for contract_address, data in wallet["tokens"].items():
-            token_price, market_cap, token_name = get_token_information(contract_address)
-            if not token_price or not market_cap:
-                balance_message += (
-                    f"\n➤ Token Name: {data['name']}\n"
-                    f"   {contract_address}\n"
-                    f"   Balance: {format_large_number(data['quantity'])}\n"
-                    f"   Data unavailable due to API limits.\n"
-                )
-                continue
-
-            pnl = (market_cap - data['purchase_market_cap']) / data['purchase_market_cap'] * 100 if data['purchase_market_cap'] else 0
-            profit_loss = (pnl * data['sol_spent']) / 100 if data['sol_spent'] else 0
-
-            balance_message += (
-                f"\n➤ Token Name: {token_name}\n"
-                f"   {contract_address}\n"
-                f"   Balance: {format_large_number(data['quantity'])}\n"
-                f"   Purchase Market Cap: ${format_large_number(data['purchase_market_cap'])}\n"
-                f"   Current Market Cap: ${format_large_number(market_cap)}\n"
-                f"   Buys {data['sol_spent']} SOL\n"
-                f"   Sells {data['sol_sold']} SOL\n"
-            )
+    wallet = await load_wallet(user_id)
+    if not wallet["tokens"]:
+        return "No tokens to sell."
 
-            if pnl > 0:
-                balance_message += f"   PNL: +{pnl:.2f}% (+{profit_loss:.2f} SOL)🟢\n"
-            else:
-                balance_message += f"   PNL: {pnl:.2f}% ({profit_loss:.2f} SOL)🔴\n"
-    else:
-        balance_message += "No tokens in your wallet.\n"
-    return balance_message
-
-def get_transaction_history(user_id):
-    wallet = load_wallet(user_id)
-    if "history" not in wallet or not wallet["history"]:
-        return "No transaction history available."
+    sol_price, token_infos = await asyncio.gather(prices.sol_price(), prices.tokens_information(list(wallet["tokens"])))
+    if not sol_price:
+        return "Unable to fetch Solana price. Try again later."
+
+    transactions = []
+    skipped = []
+    total_sol = total_pnl = 0
+    result = f"You have sold {percentage:g}% of your positions:\n"
+    for contract_address, position in list(wallet["tokens"].items()):
+        token_price, _, token_name = token_infos.get(contract_address, (None, None, None))
+        amount_tokens = position["quantity"] * percentage / 100
+        if not token_price:
+            skipped.append(position.get("name") or contract_address)
+            continue
+        if amount_tokens <= 0.01:
+            continue
+        amount_sol, trade_pnl, transaction = apply_sell(wallet, contract_address, amount_tokens, sol_price, token_price, token_name)
+        transactions.append(transaction)
+        total_sol += amount_sol
+        total_pnl += trade_pnl
+        result += f"   {token_name}: {amount_tokens:.2f} tokens for {amount_sol:.4f} SOL ({trade_pnl:+.4f} SOL)\n"
+
+    if not transactions:
+        return "Unable to fetch prices for your tokens. Nothing was sold."
+    save_wallet(user_id, wallet, transactions)
+    leaderboard.record_wallet(user_id, wallet)
+    result += f"Total: {total_sol:.4f} SOL (${total_sol * sol_price:.2f}), PNL {total_pnl:+.4f} SOL."
+    if skipped:
+        result += "\nNo price available, not sold: " + ", ".join(skipped)
+    return result
+
+# Ordres limites : évalués à chaque nouveau prix publié sur le flux partagé
+order_book = OrderBook()
+order_engine = LimitOrderEngine(order_book, buy_token, sell_token)
+price_feed.subscribe(order_engine.on_price)
+
+def open_order_book():
+    """Charge le carnet d'ordres (appel bloquant, au démarrage) ; un worker n'ouvre que celui de son shard."""
+    if constants.SHARD_INDEX >= 0:
+        # Worker : carnet propre au shard, repris à la première exécution des ordres de ses utilisateurs
+        shard_index, workers = constants.SHARD_INDEX, constants.WORKERS
+        order_book.path = os.path.join(constants.LIMIT_ORDERS_DIR, f"orders_{shard_index}.json")
+        order_book.seed_path = os.path.join(constants.LIMIT_ORDERS_DIR, "orders.json")
+        order_book.owns = lambda user_id: shard_for(user_id, workers) == shard_index
+    order_book.open()
+
+async def show_balance(user_id, page=0):
+    """Retourne (page du message de solde, nombre de pages) ; les blocs de tokens inchangés viennent du cache de rendu."""
+    wallet = await load_wallet(user_id)
+    # Prix du SOL et des tokens récupérés en parallèle
+    sol_price, token_infos = await asyncio.gather(get_sol_price(), get_tokens_information(wallet.get("tokens", {}).keys()))
+    return render_balance(wallet, sol_price or 0, token_infos, page)
+
+async def get_stats_message(user_id):
+    """Retourne le résumé des statistiques de trading (agrégats maintenus à chaque trade)."""
+    wallet = await load_wallet(user_id)
+    stats = get_stats(wallet)
+    stats_message = (
+        "📈 Trading Stats 📈\n\n"
+        f"Trades: {stats['buys']} buys / {stats['sells']} sells\n"
+        f"Win rate: {win_rate(wallet):.2f}% ({stats['wins']}W / {stats['losses']}L)\n"
+        f"Volume: {stats['volume_sol']:.2f} SOL\n"
+        f"Realized PNL: {stats['realized_pnl']:+.2f} SOL\n"
+        f"Open cost basis: {stats['cost_basis']:.2f} SOL\n"
+        f"Time-weighted return: {time_weighted_return(wallet):+.2f}%\n"
+    )
+    best = sorted(stats["tokens"].items(), key=lambda item: item[1]["realized_pnl"], reverse=True)[:3]
+    best = [(ca, token) for ca, token in best if token["realized_pnl"] > 0]
+    if best:
+        stats_message += "\n🏆 Best tokens:\n"
+        for ca, token in best:
+            name = wallet["tokens"].get(ca, {}).get("name", ca[:8])
+            stats_message += f"   {name}: {token['realized_pnl']:+.2f} SOL\n"
+    return stats_message
+
+def get_leaderboard_message(user_id, count=LEADERBOARD_SIZE):
+    """Retourne le top des traders et le rang de l'utilisateur."""
+    leaderboard_message = "🏆 Leaderboard 🏆\n\n"
+    top = leaderboard.top(count)
+    if not top:
+        return leaderboard_message + "No traders ranked yet."
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    for position, (ranked_user_id, score) in enumerate(top, start=1):
+        marker = " (you)" if ranked_user_id == str(user_id) else ""
+        leaderboard_message += f"{medals.get(position, f'{position}.')} Trader …{ranked_user_id[-4:]}{marker}: {score:+.2f} SOL\n"
+    rank, score = leaderboard.rank(user_id)
+    if rank is not None:
+        leaderboard_message += f"\nYour rank: #{rank} of {len(leaderboard)} ({score:+.2f} SOL)"
+    return leaderboard_message
+
+async def get_transaction_history(user_id, page=0):
+    """Retourne (message, nombre de pages) pour une page de l'historique (0 = la plus récente)."""
+    history, page_count = await get_history_page(user_id, page)
+    if not history:
+        return "No transaction history available.", page_count
     
-    history_message = "📜 *Transaction History* 📜\n\n"
-    for tx in wallet["history"][-10:]:  # Limite aux 10 dernières transactions
+    history_message = f"📜 *Transaction History* 📜 ({page + 1}/{page_count})\n\n"
+    for tx in history:
         if tx["type"] == "buy":
             history_message += (
                 f"[{tx['timestamp']}] BUY {tx['token']}\n"
@@ -320,4 +330,4 @@ def get_transaction_history(user_id):
                 f"SOL: {tx['sol_amount']:.2f} @ ${tx['price_usd']:.4f}\n"
                 f"PNL: {tx['pnl']:+.2f} SOL\n\n"
             )
-    return history_message
\ No newline at end of file
+    return history_message, page_count
\ No newline at end of file
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from constants import DRAIN_TIMEOUT
+from metrics import active_users
+
+# Borne passée à BaseUpdateProcessor : la vraie borne est appliquée dans
+# do_process_update, après le verrou de l'utilisateur.
+_UNBOUNDED = 1_000_000
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Traite les mises à jour en parallèle, tout en gardant l'ordre pour un même utilisateur.
+
+    Les mises à jour de deux utilisateurs différents s'exécutent
+    concurrement ; celles d'un même utilisateur passent une à une, dans leur
+    ordre d'arrivée. À l'arrêt, les mises à jour en cours sont terminées
+    (au plus DRAIN_TIMEOUT secondes).
+
+    BaseUpdateProcessor reçoit une borne très large : max_concurrent_updates
+    est appliqué par notre propre sémaphore, pris après le verrou de
+    l'utilisateur.
+    """
+
+    def __init__(self, max_concurrent_updates, drain_timeout=DRAIN_TIMEOUT):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        super().__init__(_UNBOUNDED)
+        self.drain_timeout = drain_timeout
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._locks = {}  # user_id -> [verrou, nombre de mises à jour en attente]
+        self._in_flight = set()
+
+    async def do_process_update(self, update, coroutine):
+        """Attend le tour de l'utilisateur, puis seulement une place de concurrence.
+
+        Une rafale de mises à jour d'un même utilisateur n'occupe ainsi qu'une
+        place : les suivantes attendent leur tour sans bloquer les autres
+        utilisateurs.
+        """
+        task = asyncio.current_task()
+        self._in_flight.add(task)
+        try:
+            user = update.effective_user if isinstance(update, Update) else None
+            if user is None:
+                async with self._slots:
+                    await coroutine
+                return
+            entry = self._locks.setdefault(user.id, [asyncio.Lock(), 0])
+            entry[1] += 1
+            active_users.set(len(self._locks))
+            try:
+                async with entry[0], self._slots:
+                    await coroutine
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[user.id]
+                    active_users.set(len(self._locks))
+        finally:
+            self._in_flight.discard(task)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pending = [task for task in self._in_flight if not task.done()]
+        if not pending:
+            return
+        logging.info(f"Draining {len(pending)} in-flight updates...")
+        _, still_running = await asyncio.wait(pending, timeout=self.drain_timeout)
+        if still_running:
+            logging.warning(f"{len(still_running)} updates still running after {self.drain_timeout}s drain")
@@ -0,0 +1,160 @@
+"""APIs de marché simulées en local (Binance, Birdeye, RPC Solana, DexScreener) pour les benchmarks.
+
+Chaque API tourne dans son propre serveur HTTP (thread) avec une latence, un
+taux d'erreurs 500 et des rafales de 429 configurables, et compte ses appels.
+"""
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def token_price(address):
+    """Prix déterministe d'un token fictif, avec une légère oscillation dans le temps."""
+    base = (zlib.crc32(address.encode()) % 10_000 + 1) / 1_000_000
+    return base * (1 + 0.05 * math.sin(time.time() / 30 + len(address)))
+
+
+def binance_response(method, path, query, body):
+    return {"symbol": "SOLUSDT", "price": f"{150 + 2 * math.sin(time.time() / 60):.2f}"}
+
+
+def birdeye_response(method, path, query, body):
+    if path.endswith("/multi_price"):
+        addresses = [ca for ca in query.get("list_address", [""])[0].split(",") if ca]
+        return {"success": True, "data": {ca: {"value": token_price(ca)} for ca in addresses}}
+    return {"success": True, "data": {"value": token_price(query.get("address", [""])[0])}}
+
+
+def rpc_response(method, path, query, body):
+    def supply(request):
+        return {
+            "jsonrpc": "2.0",
+            "id": request.get("id"),
+            "result": {"value": {"amount": "1000000000000000", "decimals": 6}},
+        }
+
+    return [supply(request) for request in body] if isinstance(body, list) else supply(body)
+
+
+def dexscreener_response(method, path, query, body):
+    addresses = [ca for ca in path.rsplit("/", 1)[-1].split(",") if ca]
+    return [{"baseToken": {"address": ca, "name": f"Stub {ca[:8]}", "symbol": ca[:4].upper()}} for ca in addresses]
+
+
+class StubUpstream:
+    """Serveur HTTP local d'une API simulée.
+
+    Pendant les burst_duration premières secondes de chaque période de
+    burst_period secondes, toutes les requêtes reçoivent un 429 (avec
+    Retry-After si retry_after est défini) ; en dehors, une fraction
+    error_rate reçoit un 500.
+    """
+
+    def __init__(self, name, respond, latency=0.0, error_rate=0.0, burst_period=0, burst_duration=0, retry_after=None, seed=None):
+        self.name = name
+        self.respond = respond
+        self.latency = latency
+        self.error_rate = error_rate
+        self.burst_period = burst_period
+        self.burst_duration = burst_duration
+        self.retry_after = retry_after
+        self.calls = Counter()  # code HTTP -> nombre de réponses
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def start(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, comme les vraies APIs
+
+            def do_GET(self):
+                upstream.handle(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                upstream.handle(self, json.loads(self.rfile.read(length) or b"null"))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f"stub-{self.name}", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _status(self):
+        if self.burst_period and (time.monotonic() - self._started_at) % self.burst_period < self.burst_duration:
+            return 429
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+        return 500 if failed else 200
+
+    def handle(self, request, body):
+        if self.latency:
+            time.sleep(self.latency)
+        status = self._status()
+        with self._lock:
+            self.calls[status] += 1
+        headers = {}
+        if status == 200:
+            url = urlsplit(request.path)
+            payload = self.respond(request.command, url.path, parse_qs(url.query), body)
+        else:
+            payload = {"error": "rate limited" if status == 429 else "internal error"}
+            if status == 429 and self.retry_after is not None:
+                headers["Retry-After"] = str(self.retry_after)
+        data = json.dumps(payload).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(data)
+
+
+def start_upstreams(**behaviour):
+    """Démarre les quatre APIs simulées avec le même comportement ; retourne {nom: StubUpstream}."""
+    responders = {
+        "binance": binance_response,
+        "birdeye": birdeye_response,
+        "rpc": rpc_response,
+        "dexscreener": dexscreener_response,
+    }
+    return {name: StubUpstream(name, respond, **behaviour).start() for name, respond in responders.items()}
+
+
+def upstream_environ(upstreams):
+    """Variables d'environnement qui redirigent les URLs de constants.py vers les APIs simulées."""
+    return {
+        "BINANCE_API_URL": f"{upstreams['binance'].url}/api/v3/ticker/price?symbol=SOLUSDT",
+        "BIRDEYE_API_URL": f"{upstreams['birdeye'].url}/defi/price?address=",
+        "BIRDEYE_MULTI_PRICE_URL": f"{upstreams['birdeye'].url}/defi/multi_price?list_address=",
+        # Clé factice : le bench suit le même chemin (en-tête X-API-KEY) qu'en production
+        "BIRDEYE_API_KEY": "bench-key",
+        "RPC_URL": upstreams["rpc"].url,
+        "DEX_API_URL": f"{upstreams['dexscreener'].url}/tokens/v1/solana/",
+    }
@@ -1,39 +1,57 @@
+import asyncio
+import functools
 import os
-import json
-from cachetools import TTLCache, cached
-from colorama import Fore, Style
-from constants import WALLETS_DIR, CACHE_TTL, CACHE_MAXSIZE
+import weakref
+from constants import HISTORY_PAGE_SIZE
+from portfolio import prune_positions
+from storage import create_wallet_store
+from wallet_cache import WalletCache
 
 
-# Initialisation du cache
-cache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+# Portefeuilles gardés en mémoire, écrits sur disque par lots (stockage créé au premier accès)
+wallet_cache = WalletCache(store_factory=create_wallet_store)
 
-def get_wallet_file(user_id):
-    """Retourne le chemin du fichier de portefeuille pour un utilisateur donné."""
-    if not os.path.exists(WALLETS_DIR):
-        os.makedirs(WALLETS_DIR)
-    return os.path.join(WALLETS_DIR, f"wallet_{user_id}.json")
+# Un verrou par utilisateur : les opérations lecture-modification-écriture
+# d'un même portefeuille ne s'entrelacent pas entre deux await. Références
+# faibles : le verrou d'un utilisateur inactif (ni détenu ni attendu) disparaît.
+_wallet_locks = weakref.WeakValueDictionary()
 
-def load_wallet(user_id):
+def wallet_lock(user_id):
+    """Retourne le verrou asyncio protégeant le portefeuille d'un utilisateur."""
+    key = str(user_id)
+    lock = _wallet_locks.get(key)
+    if lock is None:
+        lock = _wallet_locks[key] = asyncio.Lock()
+    return lock
+
+def with_wallet_lock(func):
+    """Décorateur : exécute la coroutine func(user_id, ...) sous le verrou du portefeuille."""
+    @functools.wraps(func)
+    async def wrapper(user_id, *args, **kwargs):
+        async with wallet_lock(user_id):
+            return await func(user_id, *args, **kwargs)
+    return wrapper
+
+async def load_wallet(user_id):
     """Charge les données du portefeuille pour un utilisateur donné."""
-    wallet_file = get_wallet_file(user_id)
-    if not os.path.exists(wallet_file):
-        with open(wallet_file, "w") as file:
-            json.dump({"sol_balance": 0, "tokens": {}, "general_pnl": 0, "history" :[]}, file)
-    
-    with open(wallet_file, "r") as file:
-        return json.load(file)
+    return await wallet_cache.load(user_id)
 
-def save_wallet(user_id, wallet):
-    """Sauvegarde les données du portefeuille pour un utilisateur donné."""
-    wallet_file = get_wallet_file(user_id)
+def save_wallet(user_id, wallet, new_history=()):
+    """Sauvegarde le portefeuille d'un utilisateur et ajoute les nouvelles transactions à son historique."""
     # Supprime les tokens avec une quantité inférieure à 1
-    tokens_to_remove = [address for address, info in wallet["tokens"].items() if info["quantity"] < 1]
-    for address in tokens_to_remove:
-        del wallet["tokens"][address]
+    prune_positions(wallet)
+    wallet_cache.save(user_id, wallet, new_history)
+
+async def get_history_page(user_id, page, page_size=HISTORY_PAGE_SIZE):
+    """Retourne (transactions de la page, nombre de pages) ; la page 0 est la plus récente."""
+    # Les transactions encore en mémoire doivent être écrites avant de lire l'historique
+    await wallet_cache.flush([user_id])
+    return await asyncio.to_thread(_read_history_page, user_id, page, page_size)
 
-    with open(wallet_file, "w") as file:
-        json.dump(wallet, file, indent=4)
+def _read_history_page(user_id, page, page_size):
+    store = wallet_cache.store
+    page_count = max(-(-store.history_count(user_id) // page_size), 1)
+    return store.history_page(user_id, page, page_size), page_count
 
 
 def format_large_number(number):
@@ -0,0 +1,133 @@
+import asyncio
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from constants import WALLET_CACHE_SIZE
+from metrics import cache_lookups, wallet_io_seconds
+
+
+class WalletCache:
+    """Cache mémoire des portefeuilles avec écriture différée (write-behind).
+
+    Les lectures sont servies depuis la mémoire (éviction LRU). Les
+    sauvegardes marquent le portefeuille comme modifié ; flush() écrit
+    ensuite tous les portefeuilles modifiés en un seul lot, hors de la
+    boucle asyncio. store_factory permet de ne créer le stockage qu'au
+    premier accès.
+    """
+
+    def __init__(self, store=None, maxsize=WALLET_CACHE_SIZE, store_factory=None):
+        self._store = store
+        self._store_factory = store_factory
+        self._store_lock = threading.Lock()  # premier accès possible depuis un thread du pool
+        self.maxsize = maxsize
+        self._wallets = OrderedDict()  # user_id -> portefeuille
+        self._dirty = {}  # user_id -> transactions en attente d'écriture
+        self._writing = set()  # user_id dont l'écriture est en cours dans un thread
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def store(self):
+        with self._store_lock:
+            if self._store_factory is not None:
+                self._store, self._store_factory = self._store_factory(), None
+            return self._store
+
+    async def load(self, user_id):
+        """Retourne une copie du portefeuille (les appelants peuvent la modifier librement).
+
+        Un défaut de cache lit le stockage dans un thread, hors de la boucle.
+        """
+        key = str(user_id)
+        wallet = self._wallets.get(key)
+        if wallet is None:
+            cache_lookups.inc(cache="wallet", result="miss")
+            loaded = await asyncio.to_thread(self._load, user_id)
+            # Une sauvegarde a pu arriver pendant la lecture : la version en mémoire prime
+            wallet = self._wallets.setdefault(key, loaded)
+            self._evict()
+        else:
+            cache_lookups.inc(cache="wallet", result="hit")
+            self._wallets.move_to_end(key)
+        return copy.deepcopy(wallet)
+
+    def _load(self, user_id):
+        with wallet_io_seconds.time(operation="load"):
+            return self.store.load(user_id)
+
+    def save(self, user_id, wallet, new_history=()):
+        """Remplace le portefeuille en mémoire ; l'écriture disque se fait au prochain flush()."""
+        key = str(user_id)
+        self._wallets[key] = wallet
+        self._wallets.move_to_end(key)
+        self._dirty.setdefault(key, []).extend(new_history)
+        self._evict()
+
+    def _evict(self):
+        # Les portefeuilles modifiés restent en mémoire jusqu'à la fin de leur
+        # écriture : relus entre-temps depuis le stockage, ils seraient périmés
+        for key in list(self._wallets):
+            if len(self._wallets) <= self.maxsize:
+                break
+            if key not in self._dirty and key not in self._writing:
+                del self._wallets[key]
+
+    def dirty_count(self):
+        """Retourne le nombre de portefeuilles en attente d'écriture."""
+        return len(self._dirty)
+
+    def cached_wallets(self):
+        """Retourne {user_id: portefeuille} des portefeuilles en mémoire (copie du dictionnaire, à prendre sur la boucle)."""
+        return dict(self._wallets)
+
+    async def held_contract_addresses(self):
+        """Retourne les tokens détenus dans au moins un portefeuille (mémoire, puis stockage dans un thread).
+
+        La mémoire est parcourue sur la boucle : un thread ne doit pas itérer
+        le cache pendant que la boucle le modifie.
+        """
+        addresses = set()
+        for wallet in self._wallets.values():
+            addresses.update(wallet.get("tokens", {}))
+        addresses.update(await asyncio.to_thread(self.store.held_contract_addresses))
+        return addresses
+
+    async def flush(self, user_ids=None):
+        """Écrit les portefeuilles modifiés (tous, ou seulement user_ids) dans un thread.
+
+        Un échec est journalisé sans être propagé : seuls les portefeuilles
+        non écrits retournent dans la file, pour le prochain passage.
+        """
+        async with self._flush_lock:
+            wanted = None if user_ids is None else {str(user_id) for user_id in user_ids}
+            keys = [key for key in self._dirty if wanted is None or key in wanted]
+            if not keys:
+                return
+            batch = [(key, self._wallets[key], self._dirty.pop(key)) for key in keys]
+            self._writing.update(keys)
+            try:
+                written = await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                logging.error(f"Error flushing {len(batch)} wallets: {e}")
+                written = set()
+            finally:
+                self._writing.difference_update(keys)
+            # Remet les transactions non écrites en tête de file
+            for key, _, history in batch:
+                if key not in written:
+                    self._dirty[key] = history + self._dirty.get(key, [])
+            self._evict()
+
+    def _write(self, batch):
+        """Écrit le lot portefeuille par portefeuille ; retourne les clés écrites."""
+        written = set()
+        for key, wallet, history in batch:
+            try:
+                with wallet_io_seconds.time(operation="save"):
+                    self.store.save(key, wallet, history)
+            except Exception as e:
+                logging.error(f"Error saving wallet for user {key}: {e}")
+                continue
+            written.add(key)
+        return written